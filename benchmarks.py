@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the timespans and timestamps functions on synthetic data.
+
+    python benchmarks.py                          # sizes 1e3 to 1e6
+    python benchmarks.py --max-size 1e8 --output results.csv
+    python benchmarks.py --compare results.csv    # ratios against a previous run
+
+Each benchmark is timed (best of --repeat runs) then run once more under tracemalloc
+to record its peak memory.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import contextlib
+import io
+from functools import partial
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from chrony import timespans, timestamps
+
+SPAN_LAYOUTS = ('contiguous', 'gapped', 'overlapping')
+
+
+def make_spans(n, layout='contiguous', kinds=0, seed=0):
+    """
+    Returns n spans sorted by beg, lasting 1 to 600s, with a 'state' column of 10 values
+    and, if kinds, a 'kind' column of that many values. Spans follow each other without
+    gaps ('contiguous'), with gaps of 1 to 600s ('gapped') or last up to 10 times longer
+    and overlap ('overlapping').
+    """
+    if layout not in SPAN_LAYOUTS:
+        raise ValueError('Unknown layout %s' % layout)
+    rng = np.random.RandomState(seed)
+    durations = rng.randint(1, 601, n).astype('m8[s]')
+    steps = durations
+    if layout == 'gapped':
+        steps = durations + rng.randint(1, 601, n).astype('m8[s]')
+    elif layout == 'overlapping':
+        durations = durations * 10
+    begs = np.datetime64('2015-01-01', 'ns') + np.concatenate(([0], np.cumsum(steps[:-1]))).astype('m8[ns]')
+    df = pd.DataFrame({
+        'ts_beg': begs,
+        'ts_end': begs + durations.astype('m8[ns]'),
+        'state': rng.randint(0, 10, n),
+    })
+    if kinds:
+        df['kind'] = rng.randint(0, kinds, n)
+    return df
+
+
+def make_stamps(n, hole_density=.01, time_step='1s', seed=0):
+    """
+    Returns a time series of n points every time_step, with a 'data' column where about
+    hole_density of the points start a hole of 1 to 20 missing points.
+    """
+    rng = np.random.RandomState(seed)
+    data = np.cumsum(rng.randn(n))
+    starts = np.flatnonzero(rng.rand(n) < hole_density)
+    lengths = rng.randint(1, 21, len(starts))
+    missing = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(missing, starts, 1)
+    np.add.at(missing, np.minimum(starts + lengths, n), -1)
+    data[np.cumsum(missing[:-1]) > 0] = np.nan
+    return pd.DataFrame({'data': data}, index=pd.date_range('2015-01-01', periods=n, freq=time_step))
+
+
+def _begs_ends(df):
+    return df['ts_beg'], df['ts_end']
+
+
+def _quiet(func):
+    """
+    Returns func with its standard output discarded.
+    """
+    def wrapper(*args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(*args)
+    return wrapper
+
+
+# (name, setup returning the arguments given the size, function)
+BENCHMARKS = [
+    ('audit_timespan', lambda n: _begs_ends(make_spans(n)), timespans.audit_timespan),
+    ('describe_timespan', lambda n: _begs_ends(make_spans(n, 'gapped')), timespans.describe_timespan),
+    ('to_stamps', lambda n: (make_spans(n), ['state'], []), timespans.to_stamps),
+    ('to_spans', lambda n: (timespans.to_stamps(make_spans(n), ['state'], []), ['state'], []), timespans.to_spans),
+    ('merge_overlapping_events', lambda n: (make_spans(n, 'overlapping'), 'ts_beg', 'ts_end'), timespans.merge_overlapping_events),
+    ('merge_overlapping_events_kind', lambda n: (make_spans(n, 'overlapping', kinds=100), 'ts_beg', 'ts_end', 'kind'), timespans.merge_overlapping_events),
+    ('find_holes', lambda n: (make_stamps(n),), timestamps.find_holes),
+    ('fill_data', lambda n: (make_stamps(n), 10), timestamps.fill_data),
+    ('cut', lambda n: (make_stamps(n), 10), timestamps.cut),
+    # in one process per CPU, to compare with the ones above
+    ('find_holes_n_jobs', lambda n: (make_stamps(n),), partial(timestamps.find_holes, n_jobs=-1)),
+    ('fill_data_n_jobs', lambda n: (make_stamps(n), 10), partial(timestamps.fill_data, n_jobs=-1)),
+    ('cut_n_jobs', lambda n: (make_stamps(n), 10), partial(timestamps.cut, n_jobs=-1)),
+    ('describe', lambda n: (make_stamps(n),), _quiet(timestamps.describe)),
+]
+
+
+def measure(func, args, repeat=3):
+    """
+    Returns the best duration in seconds of func(*args) over repeat runs and its peak
+    memory in bytes.
+    """
+    durations = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - t)
+    tracemalloc.start()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(durations), peak
+
+
+def run(sizes, names=None, repeat=3):
+    """
+    Runs the benchmarks (all of them or the ones in names) for each size and returns a
+    frame with columns benchmark, size, seconds and peak_mb.
+    """
+    rows = []
+    for name, setup, func in BENCHMARKS:
+        if names and name not in names:
+            continue
+        for size in sizes:
+            seconds, peak = measure(func, setup(size), repeat)
+            rows.append((name, size, seconds, peak / 2 ** 20))
+            print('%-30s %10d %10.4fs %10.1fMB' % rows[-1])
+    return pd.DataFrame(rows, columns=['benchmark', 'size', 'seconds', 'peak_mb'])
+
+
+def compare(results, reference):
+    """
+    Returns results with the ratios of their durations and peak memory to the ones of
+    reference (>1 means slower or bigger).
+    """
+    retval = results.merge(reference, on=['benchmark', 'size'], how='left', suffixes=('', '_reference'))
+    retval['seconds_ratio'] = retval['seconds'] / retval['seconds_reference']
+    retval['peak_mb_ratio'] = retval['peak_mb'] / retval['peak_mb_reference']
+    return retval[['benchmark', 'size', 'seconds', 'peak_mb', 'seconds_ratio', 'peak_mb_ratio']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of chrony')
+    parser.add_argument('--min-size', type=float, default=1e3)
+    parser.add_argument('--max-size', type=float, default=1e6)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--benchmark', action='append', help='name of a benchmark to run (all by default)')
+    parser.add_argument('--output', help='csv file to write the results to')
+    parser.add_argument('--compare', help='csv file of a previous run to compare the results with')
+    args = parser.parse_args()
+    sizes = [int(10 ** e) for e in range(int(np.log10(args.min_size)), int(np.log10(args.max_size)) + 1)]
+    results = run(sizes, args.benchmark, args.repeat)
+    if args.output:
+        results.to_csv(args.output, index=False)
+    if args.compare:
+        with pd.option_context('display.width', 1000, 'display.max_columns', None):
+            print(compare(results, pd.read_csv(args.compare)))
+
+
+if __name__ == '__main__':
+    main()
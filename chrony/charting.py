@@ -2,16 +2,75 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import matplotlib.pyplot as plt
 import numpy as np
-from .core import compute_category_index
+import pandas as pd
+
+COLORS = ('r', 'b')
+LABEL_CHAR_WIDTH = .6  # average character width, relative to the font size
+
+
+def _as_numbers(values):
+    '''
+    Returns values as an array of numbers: nanoseconds since the epoch for datetime-like
+    values (datetime64 arrays, Series, DatetimeIndex or lists of Timestamps).
+    '''
+    values = np.asarray(values)
+    if values.dtype.kind == 'O':
+        return pd.to_datetime(values).asi8
+    if values.dtype.kind == 'M':
+        return values.astype('M8[ns]').view(np.int64)
+    return values
+
+
+def _normalize(values, xlim):
+    '''
+    Returns the positions of values as fractions of xlim.
+    '''
+    values, xlim = _as_numbers(values), _as_numbers(list(xlim))
+    return ((values - xlim[0]) / (xlim[1] - xlim[0])).astype('d')
+
+
+def _aggregate_pixels(x0, x1, width):
+    '''
+    Given spans [x0, x1) as fractions of the axis sorted by x0 and the axis width in
+    pixels, returns the positions of the spans to draw and the spans narrower than a
+    pixel aggregated at screen resolution: each run of consecutive pixel columns touched by
+    narrow spans becomes a single span. Returns (positions, x0, x1) where positions is the
+    position of the (first) span drawn.
+    '''
+    narrow = (x1 - x0) * width < 1
+    wide = np.flatnonzero(~narrow)
+    narrow = np.flatnonzero(narrow)
+    columns, firsts = np.unique(np.floor(x0[narrow] * width).astype(np.int64), return_index=True)
+    run_starts = np.ones(len(columns), dtype=bool)
+    run_starts[1:] = columns[1:] != columns[:-1] + 1
+    runs = np.flatnonzero(run_starts)
+    run_ends = np.flatnonzero(np.append(run_starts[1:], True)[:len(columns)])
+    positions = np.concatenate([wide, narrow[firsts[runs]]])
+    x0 = np.concatenate([x0[wide], columns[runs] / width])
+    x1 = np.concatenate([x1[wide], (columns[run_ends] + 1) / width])
+    return positions, x0, x1
 
 
 def plot_events(categories, xmin, xmax, labels=None, xlim=None, linewidth=10):
-    index = compute_category_index(categories)
-    xlim = xlim or (min(xmin), max(xmax))
-    xmin_normalized = np.array([(x - xlim[0]) / (xlim[1] - xlim[0]) for x in xmin])
-    xmax_normalized = np.array([(x - xlim[0]) / (xlim[1] - xlim[0]) for x in xmax])
+    '''
+    Draws the spans [xmin, xmax) on one line per category, alternating colors. Spans of a
+    category are drawn as a single collection and spans narrower than a pixel are aggregated
+    at screen resolution. Labels are only drawn on the spans they fit in.
+    '''
+    # matplotlib is imported on first use, importing chrony does not initialize a backend
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    from matplotlib.font_manager import FontProperties
+
+    # Series are read by position, whatever their index
+    xmin, xmax = np.asarray(xmin), np.asarray(xmax)
+    labels = None if labels is None else np.asarray(labels)
+    codes, uniques = pd.factorize(np.asarray(categories), sort=True)
+    index = {category: code + 1 for code, category in enumerate(uniques)}
+    xlim = xlim or (np.min(xmin), np.max(xmax))
+    xmin_normalized = _normalize(xmin, xlim)
+    xmax_normalized = _normalize(xmax, xlim)
 
     plt.figure(figsize=(20, 5))
     plt.xlim(xlim)
@@ -19,11 +78,36 @@ def plot_events(categories, xmin, xmax, labels=None, xlim=None, linewidth=10):
     plt.xticks(fontsize=18)
     plt.yticks(list(index.values()), list(index.keys()), fontsize=18)
     plt.gcf().autofmt_xdate()
-    for i in range(len(categories)):
-        if labels is not None:
+    ax = plt.gca()
+    width = ax.bbox.width
+    # x in axes coordinates (as axhline), y in data coordinates
+    transform = ax.get_yaxis_transform()
+    char_width = LABEL_CHAR_WIDTH * FontProperties(size='x-large').get_size_in_points() * plt.gcf().dpi / 72
+    order = np.lexsort((xmin_normalized, codes))
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    for rows in np.split(order, bounds):
+        if not len(rows):
+            continue
+        positions, x0, x1 = _aggregate_pixels(xmin_normalized[rows], xmax_normalized[rows], width)
+        rows = rows[positions]
+        y = np.full(len(rows), codes[rows[0]] + 1, dtype='d')
+        ax.add_collection(LineCollection(
+            np.stack([np.column_stack([x0, y]), np.column_stack([x1, y])], axis=1),
+            linewidths=linewidth,
+            colors=[COLORS[i % 2] for i in rows],
+            capstyle='butt',
+            transform=transform
+        ))
+        if labels is None:
+            continue
+        # Aggregated spans are never wide enough for the label of their first span
+        fits = (xmax_normalized[rows] - xmin_normalized[rows]) * width >= char_width
+        for i in rows[fits]:
+            if len('%s' % labels[i]) * char_width > (xmax_normalized[i] - xmin_normalized[i]) * width:
+                continue
             plt.text(
                 x=xmin[i],
-                y=index[categories[i]] + .1 if i % 2 else index[categories[i]] - .1,
+                y=codes[i] + 1.1 if i % 2 else codes[i] + .9,
                 s=labels[i],
                 horizontalalignment='left',
                 verticalalignment='bottom' if i % 2 else 'top',
@@ -31,11 +115,3 @@ def plot_events(categories, xmin, xmax, labels=None, xlim=None, linewidth=10):
                 size='x-large',
                 weight='bold'
             )
-        plt.axhline(
-            linewidth=linewidth,
-            y=index[categories[i]],
-            xmin=xmin_normalized[i],
-            xmax=xmax_normalized[i],
-            color='b' if i % 2 else 'r',
-            label='label'
-        )
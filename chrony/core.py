@@ -10,15 +10,94 @@ def compute_category_index(categories):
     return {category: index + 1 for index, category in enumerate(sorted(set(categories)))}
 
 
+def as_datetime_index(values):
+    """
+    Returns a DatetimeIndex of a timestamp or of an array-like of timestamps.
+    """
+    if np.ndim(values) == 0:
+        values = [values]
+    return pd.DatetimeIndex(values)
+
+
+def _kind_codes(df, kind):
+    """
+    Returns the int64 codes of the kinds (the combined values of the columns in kind) of
+    the rows of df, in the order of the sorted kinds, -1 if a value is missing.
+    """
+    codes = np.zeros(len(df), dtype=np.int64)
+    for column in kind:
+        column_codes, uniques = pd.factorize(df[column], sort=True)
+        codes = np.where(column_codes < 0, -1, codes * len(uniques) + column_codes)
+    return codes
+
+
+def _expand_ranges(los, his):
+    """
+    Returns the (range, position) arrays of every position in each of the ranges
+    [los[range], his[range]).
+    """
+    counts = np.maximum(his - los, 0)
+    ranges = np.repeat(np.arange(len(los)), counts)
+    return ranges, np.repeat(los - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+
+def _runs(mask):
+    """
+    Returns the rows, begs and ends (exclusive) of the runs of True values in each row of
+    the 2-D boolean array mask, sorted by row then beg.
+    """
+    edges = np.diff(mask.view(np.int8), axis=1, prepend=0, append=0)
+    rows, begs = np.nonzero(edges == 1)
+    return rows, begs, np.nonzero(edges == -1)[1]
+
+
+def _weighted_interpolate(values, weights):
+    """
+    Fills in place the missing values of each row of the 2-D float array values (one
+    series per row, C-contiguous) by linear interpolation against the cumulated weights
+    between the previous and the next valid values of the row. Missing values before the
+    first or after the last valid value of a row (so all the values of an all-NaN row) stay
+    missing, and missing values between valid values with the same cumulated weight take
+    the previous valid value. Only the holes are expanded, so that the memory used beyond
+    values is proportional to the number of missing values.
+    """
+    m, n = values.shape
+    cw = np.cumsum(np.asarray(weights, dtype='d'))
+    rows, i_begs, i_ends = _runs(np.isnan(values))
+    # Holes at the beginning or the end of a row are left as is
+    inner = (i_begs > 0) & (i_ends < n)
+    rows, i_begs, i_ends = rows[inner], i_begs[inner], i_ends[inner]
+    holes, i = _expand_ranges(i_begs, i_ends)
+    p, q = i_begs[holes] - 1, i_ends[holes]
+    span = cw[q] - cw[p]
+    ratio = np.divide(cw[i] - cw[p], span, out=np.zeros(len(holes)), where=span != 0)
+    flat = values.reshape(-1)
+    offsets = rows[holes] * n
+    previous = flat[offsets + p]
+    flat[offsets + i] = previous + ratio * (flat[offsets + q] - previous)
+
+
 def weighted_interpolate(serie, weights):
-    sb = serie.fillna(method='ffill')
-    se = serie.fillna(method='bfill')
-    cw = weights.cumsum()
-    w2 = pd.Series(None, index=serie.index)
-    w2[~np.isnan(serie)] = cw[~np.isnan(serie)]
-    wb = w2.fillna(method='ffill')
-    we = w2.fillna(method='bfill')
-    cw = (cw - wb) / (we - wb)
-    r = sb + cw * (se - sb)
-    r.update(serie)
-    return r
+    """
+    Returns serie where the missing values are linearly interpolated against the cumulated
+    weights, see weighted_interpolate_frame.
+    """
+    values = np.array(serie.values, dtype='d').reshape(1, -1)
+    _weighted_interpolate(values, weights)
+    return pd.Series(values[0], index=serie.index, name=serie.name)
+
+
+def weighted_interpolate_frame(df, weights, inplace=False):
+    """
+    Interpolates the missing values of every column of df against the cumulated weights
+    (one per row, shared by all the columns) in a single pass on a 2-D float array. Missing
+    values at the beginning or end of a column, and all-NaN columns, are left missing. If
+    inplace, the columns of df which had missing values are replaced and None is returned.
+    """
+    # Fortran order makes each column contiguous, and is the layout of pandas blocks
+    values = np.array(df.values, dtype='d', order='F')
+    _weighted_interpolate(values.T, weights)
+    if not inplace:
+        return pd.DataFrame(values, index=df.index, columns=df.columns)
+    for j in np.flatnonzero(pd.isnull(df).values.any(axis=0)):
+        df.iloc[:, j] = values[:, j]
@@ -19,3 +19,15 @@ class IntegrityError(ValueError):
 
 class HasTimezoneError(ValueError):
     pass
+
+
+class BegPosteriorToEndError(ValueError):
+    pass
+
+
+class MissingDataError(ValueError):
+    pass
+
+
+class TimeStepError(ValueError):
+    pass
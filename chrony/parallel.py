@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from .core import _kind_codes
+
+
+def n_workers(n_jobs):
+    '''
+    Returns the number of processes to use given n_jobs: None or 1 for none, -1 for one
+    per CPU, -2 for all the CPUs but one...
+    '''
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, n_jobs)
+
+
+def partition_by_kind(df, kind, n_parts):
+    '''
+    Splits df into at most n_parts frames holding whole kinds (the combined values of the
+    columns in kind). Each frame holds a range of the sorted kinds, with about the same
+    number of rows in each frame. Rows whose kind is null are dropped, and the rows of a
+    kind keep their order.
+    '''
+    codes = _kind_codes(df, kind)
+    order = np.argsort(codes, kind='mergesort')
+    order = order[codes[order] >= 0]
+    codes = codes[order]
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1, [len(order)]])
+    # Cut at the beginning of the kind closest to each multiple of len / n_parts
+    targets = np.arange(1, n_parts) * len(order) / n_parts
+    after = np.clip(np.searchsorted(starts, targets), 1, len(starts) - 1)
+    cuts = np.where(targets - starts[after - 1] <= starts[after] - targets, starts[after - 1], starts[after])
+    bounds = np.unique(np.concatenate([[0], cuts, [len(order)]])).astype(np.int64)
+    return [df.iloc[order[i:j]] for i, j in zip(bounds[:-1], bounds[1:])]
+
+
+def apply_by_kind(df, by, func, n_jobs=1, **kwargs):
+    '''
+    Applies func(frame, **kwargs) to the frames of partition_by_kind(df, by) in n_jobs
+    processes and returns the concatenation of the resulting frames, in the order of the
+    kinds whatever the order in which the processes finish. func must be picklable (defined
+    at the top level of a module). If func returns frames sorted by kind, the result is the
+    one of func(df, **kwargs) without the rows whose kind is null.
+    '''
+    n_jobs = n_workers(n_jobs)
+    frames = partition_by_kind(df, by, n_jobs)
+    if len(frames) < 2:
+        return func(frames[0] if frames else df.iloc[:0], **kwargs).reset_index(drop=True)
+    with ProcessPoolExecutor(n_jobs) as executor:
+        results = list(executor.map(partial(func, **kwargs), frames))
+    return pd.concat(results, ignore_index=True)
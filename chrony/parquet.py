@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from .timespans import _kind_list
+
+
+def _pyarrow():
+    '''
+    Returns the pyarrow and pyarrow.parquet modules. pyarrow is an optional dependency,
+    imported on first use so that importing chrony does not require it.
+    '''
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Reading and writing parquet files requires pyarrow (pip install pyarrow)')
+    return pyarrow, pyarrow.parquet
+
+
+def _timestamp_column(pa, values):
+    '''
+    Returns the naive datetime values as an arrow timestamp[ns] array (int64 nanoseconds)
+    sharing their buffer.
+    '''
+    values = pd.DatetimeIndex(values).values
+    missing = np.isnat(values)
+    return pa.array(values.view(np.int64), mask=missing if missing.any() else None).view(pa.timestamp('ns'))
+
+
+def _dictionary_column(pa, values):
+    '''
+    Returns values as a dictionary-encoded arrow array: int32 codes into the sorted unique
+    values, null for the missing ones.
+    '''
+    codes, uniques = pd.factorize(values, sort=True)
+    return pa.DictionaryArray.from_arrays(
+        pa.array(codes.astype(np.int32), mask=codes < 0), pa.array(np.asarray(uniques))
+    )
+
+
+def _to_frame(table, categorical):
+    '''
+    Returns the arrow table as a dataframe, without copying the columns arrow can hand
+    over to pandas. Dictionary-encoded columns are categoricals, or decoded if not
+    categorical.
+    '''
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    if not categorical:
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = np.asarray(df[column])
+    return df
+
+
+def write_spans(df, path, beg_col='ts_beg', end_col='ts_end', state_cols=None, kind=None, row_group_size=None):
+    '''
+    Writes the spans of df to the parquet file path, sorted by kind (a column or a list of
+    columns) then beg_col, so that the statistics of the row groups let read_spans skip
+    the ones out of its time range or kinds. beg_col and end_col are stored as int64
+    timestamps and the state_cols (all the other columns by default) and kind columns as
+    dictionaries.
+    '''
+    pa, pq = _pyarrow()
+    kind = _kind_list(kind)
+    if state_cols is None:
+        state_cols = [c for c in df.columns if c not in [beg_col, end_col] + kind]
+    df = df.sort_values(kind + [beg_col], kind='mergesort')
+    columns = kind + [beg_col, end_col] + list(state_cols)
+    arrays = [
+        _timestamp_column(pa, df[column].values) if column in (beg_col, end_col) else _dictionary_column(pa, df[column].values)
+        for column in columns
+    ]
+    pq.write_table(pa.Table.from_arrays(arrays, names=columns), path, row_group_size=row_group_size)
+
+
+def read_spans(path, beg_col='ts_beg', end_col='ts_end', columns=None, start=None, end=None, kind=None, kinds=None, categorical=True):
+    '''
+    Reads the spans written by write_spans, only the ones intersecting [start, end) and,
+    given kind (a column or a list of columns), the ones whose kind is in kinds (values of
+    the column, or tuples of values of the columns). The time range and the values of each
+    kind column are pushed down to the parquet reader, which skips the row groups that do
+    not match, the combinations of values of several columns being selected once read.
+    State columns are returned as categoricals, or decoded if not categorical.
+    '''
+    _, pq = _pyarrow()
+    kind = _kind_list(kind)
+    filters = []
+    if start is not None:
+        filters.append((end_col, '>', pd.Timestamp(start)))
+    if end is not None:
+        filters.append((beg_col, '<', pd.Timestamp(end)))
+    if kinds is not None:
+        if not kind:
+            raise ValueError('kinds given without a kind column')
+        kinds = [k if isinstance(k, tuple) else (k,) for k in kinds]
+        if any(len(k) != len(kind) for k in kinds):
+            raise ValueError('kinds must have one value per kind column %s' % kind)
+        filters.extend((column, 'in', list(dict.fromkeys(v))) for column, v in zip(kind, zip(*kinds)))
+    read_columns = columns
+    if columns is not None and kinds is not None and len(kind) > 1:
+        read_columns = list(columns) + [c for c in kind if c not in columns]
+    if kinds is not None and not kinds:
+        # no kind to read, the frame is made from the schema only
+        table = pq.read_schema(path).empty_table()
+        table = table if read_columns is None else table.select(read_columns)
+    else:
+        table = pq.read_table(path, columns=read_columns, filters=filters or None)
+    df = _to_frame(table, categorical)
+    if kinds is not None and len(kind) > 1:
+        df = df[pd.MultiIndex.from_frame(df[kind]).isin(kinds)]
+    return df[list(columns) if columns is not None else df.columns].reset_index(drop=True)
+
+
+def write_stamps(df, path, row_group_size=None):
+    '''
+    Writes the time series df to the parquet file path, its index as an int64 timestamp
+    column 'ts' and its values as a column 'data'.
+    '''
+    pa, pq = _pyarrow()
+    table = pa.Table.from_arrays(
+        [_timestamp_column(pa, df.index.values), pa.array(df.values.ravel())],
+        names=['ts', 'data']
+    )
+    pq.write_table(table, path, row_group_size=row_group_size)
+
+
+def read_stamps(path, start=None, end=None):
+    '''
+    Reads the time series written by write_stamps, only its timestamps in [start, end),
+    the filters being pushed down to the parquet reader.
+    '''
+    _, pq = _pyarrow()
+    filters = []
+    if start is not None:
+        filters.append(('ts', '>=', pd.Timestamp(start)))
+    if end is not None:
+        filters.append(('ts', '<', pd.Timestamp(end)))
+    table = pq.read_table(path, columns=['ts', 'data'], filters=filters or None)
+    df = _to_frame(table, True)
+    return pd.DataFrame({'data': df['data'].values}, index=df['ts'].values)
@@ -4,16 +4,43 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import datetime
 import numpy as np
+import os
 import pandas as pd
 import pytz
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 
-from .core import compute_category_index, weighted_interpolate
-from .exceptions import BadLengthsError, BegPosteriorToEndError, OverlapError, NotSortedError, HasTimezoneError, IntegrityError
-from .timespans import audit_timespan, describe_timespan, to_stamps, to_spans, compute_segments, clean_overlap_timespan, fill_na_dataframe
+from .charting import plot_events, _aggregate_pixels
+from .core import compute_category_index, weighted_interpolate, weighted_interpolate_frame
+from .exceptions import BadLengthsError, BegPosteriorToEndError, OverlapError, NotSortedError, HasTimezoneError, IntegrityError, TimeStepError, MissingDataError
+from .timestamps import find_holes, find_hole_indices, cut, cut_fixed_size, fill_data, TimestampValidator, \
+    to_panel, audit_panel, find_holes_panel, trim_panel, fill_data_panel, describe_panel
+from .timespans import audit_timespan, audit_timespan_report, audit_timespan_chunks, describe_timespan, describe_timespan_chunks, time_in_state, TimespanStats, TimespanValidator, to_stamps, to_spans, compute_segments, compute_segment_table, clean_overlap_timespan, fill_na_dataframe, merge_overlapping_events, merge_overlapping_events_kind, SpanIndex, merge_spans, merge_stamps, \
+    union_timespans, intersect_timespans, subtract_timespans, complement_timespans, Timespans, \
+    add_time_between_events, time_between_events_stats, describe_timespan_by_kind, audit_timespan_report_by_kind
+from .parallel import partition_by_kind
+from .parquet import write_spans, read_spans, write_stamps, read_stamps
+
+try:
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+except ImportError:
+    matplotlib = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
 
 pd.set_option('display.width', 1000)
 
+# Seconds allowed to import the chrony modules in a fresh interpreter, pandas included
+IMPORT_TIME_BUDGET = 3
+
 
 class TimespanCase(unittest.TestCase):
     def test_all(self):
@@ -53,6 +80,94 @@ class TimespanCase(unittest.TestCase):
         pd.util.testing.assert_series_equal(ret, clean_overlap_timespan(begs, ends))
         # self.assertTrue(pd.Series().equals(describe_timespan(begs, ends)))
 
+    def test_audit_timespan_report(self):
+        begs = pd.Series(pd.to_datetime(['2015-1-1', '2015-1-3', '2015-1-2', '2015-1-5']))
+        ends = pd.Series(pd.to_datetime(['2015-1-2', '2015-1-2', '2015-1-6', '2015-1-7']))
+        pd.util.testing.assert_frame_equal(
+            audit_timespan_report(begs, ends),
+            pd.DataFrame({
+                'row': [1, 2, 3],
+                'error': ['BegPosteriorToEndError', 'NotSortedError', 'OverlapError'],
+                'amount': pd.to_timedelta(['1d', '1d', '1d']),
+            }, columns=['row', 'error', 'amount'])
+        )
+        pd.util.testing.assert_frame_equal(
+            audit_timespan_report(begs, ends, stop_at_first=True),
+            pd.DataFrame({
+                'row': [1],
+                'error': ['BegPosteriorToEndError'],
+                'amount': pd.to_timedelta(['1d']),
+            }, columns=['row', 'error', 'amount'])
+        )
+        report = audit_timespan_report(begs[:3], ends)
+        self.assertEqual(report['row'].tolist(), [-1])
+        self.assertEqual(report['error'].tolist(), ['BadLengthsError'])
+        self.assertTrue(audit_timespan_report(begs[:1], ends[:1]).empty)
+
+    def test_timespan_validator(self):
+        begs = pd.to_datetime(['2015-1-1', '2015-1-2', '2015-1-4', '2015-1-3', '2015-1-6'])
+        ends = pd.to_datetime(['2015-1-2', '2015-1-3', '2015-1-5', '2015-1-7', '2015-1-7'])
+        validator = TimespanValidator()
+        validator.check(begs[0], ends[0])
+        validator.check(begs[1:3], ends[1:3])
+        with self.assertRaises(NotSortedError):
+            validator.check(begs[3], ends[3])
+        validator.check(begs[4], ends[4])
+        validator = TimespanValidator(raise_errors=False)
+        for beg, end in zip(begs, ends):
+            validator.check(beg, end)
+        self.assertEqual([(row, type(error)) for row, error in validator.errors], [(3, NotSortedError), (3, OverlapError), (4, OverlapError)])
+        with self.assertRaises(HasTimezoneError):
+            TimespanValidator().check(begs.tz_localize('UTC'), ends.tz_localize('UTC'))
+
+    def test_chunks(self):
+        df = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2015-1-1', '2015-1-2', '2015-1-4', '2015-1-5', '2015-1-6']),
+            'ts_end': pd.to_datetime(['2015-1-2', '2015-1-3', '2015-1-5', '2015-1-6', '2015-1-8']),
+        })
+        chunks = [df.iloc[:2], df.iloc[2:4], df.iloc[4:]]
+        self.assertIsNone(audit_timespan_chunks(chunks))
+        pd.util.testing.assert_series_equal(describe_timespan_chunks(chunks), describe_timespan(df['ts_beg'], df['ts_end']))
+        df.loc[4, 'ts_beg'] = pd.Timestamp('2015-1-5 12:00')
+        with self.assertRaises(OverlapError):
+            audit_timespan_chunks([df.iloc[:2], df.iloc[2:4], df.iloc[4:]])
+        with self.assertRaises(NotSortedError):
+            audit_timespan_chunks([df.iloc[:2], df.iloc[2:4], df.iloc[4:]][::-1])
+
+    def test_timespan_stats(self):
+        df = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2015-1-1', '2015-1-2', '2015-1-4', '2015-1-5', '2015-1-6']),
+            'ts_end': pd.to_datetime(['2015-1-2', '2015-1-3', '2015-1-5', '2015-1-6', '2015-1-8']),
+        })
+        left = TimespanStats().update(df['ts_beg'].values[:2], df['ts_end'].values[:2])
+        right = TimespanStats().update(df['ts_beg'].values[2:3], df['ts_end'].values[2:3])
+        right.update(df['ts_beg'].values[3:], df['ts_end'].values[3:])
+        stats = left.merge(right).describe(percentiles=(0, 50, 100))
+        pd.util.testing.assert_series_equal(stats.iloc[:6], describe_timespan(df['ts_beg'], df['ts_end']))
+        for label, duration in (('duration 0%', '1d'), ('duration 50%', '1d'), ('duration 100%', '2d')):
+            self.assertAlmostEqual(stats[label] / pd.Timedelta(duration), 1, delta=.01)
+        self.assertIsNone(TimespanStats().describe())
+
+    def test_time_in_state(self):
+        df = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2015-1-1 07:30', '2015-1-1 10:15', '2015-1-1 10:45']),
+            'ts_end': pd.to_datetime(['2015-1-1 10:15', '2015-1-1 10:45', '2015-1-1 11:00']),
+            'state': ['run', 'stop', 'run'],
+        })
+        pd.util.testing.assert_frame_equal(
+            time_in_state(df, 'h', ['state']),
+            pd.DataFrame({
+                'ts': pd.to_datetime(['2015-1-1 07:00', '2015-1-1 08:00', '2015-1-1 09:00', '2015-1-1 10:00', '2015-1-1 10:00']),
+                'state': ['run', 'run', 'run', 'run', 'stop'],
+                'duration': pd.to_timedelta(['30min', '60min', '60min', '30min', '30min']),
+            }, columns=['ts', 'state', 'duration'])
+        )
+        self.assertEqual(time_in_state(df, 'D', [])['duration'].tolist(), [pd.Timedelta('3.5h')])
+        df['line'] = [1, 1, 2]
+        retval = time_in_state(df, 'h', ['state', 'line'])
+        self.assertEqual(retval[['state', 'line']].values.tolist(), [['run', 1], ['run', 1], ['run', 1], ['run', 1], ['run', 2], ['stop', 1]])
+        self.assertEqual(retval['duration'].tolist(), pd.to_timedelta(['30min', '60min', '60min', '15min', '15min', '30min']).tolist())
+
     def test_merge(self):
         span_state_columns = ['state_%s' % c for c in 'ds']
         span_value_columns = ['%s_value_%s' % (i, c) for c in 'ds' for i in ('beg', 'end')]
@@ -120,6 +235,93 @@ class TimespanCase(unittest.TestCase):
                 columns=stamp_columns
             )
 
+    def test_to_stamps_gaps(self):
+        df = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2015-1-1', '2015-1-2', '2015-1-4']),
+            'ts_end': pd.to_datetime(['2015-1-2', '2015-1-3', '2015-1-5']),
+            'state': ['a', 'b', 'c'],
+        })
+        stamps = to_stamps(df, state_columns=['state'], value_columns=[])
+        self.assertEqual(stamps['ts'].tolist(), pd.to_datetime(['2015-1-1', '2015-1-2', '2015-1-3', '2015-1-4', '2015-1-5']).tolist())
+        self.assertEqual(stamps['beg_state'].tolist(), ['a', 'b', 'UNDEFINED', 'c', 'UNDEFINED'])
+        self.assertEqual(stamps['end_state'].tolist(), ['UNDEFINED', 'a', 'b', 'UNDEFINED', 'c'])
+        spans = to_spans(stamps, state_columns=['state'], value_columns=[])
+        self.assertEqual(spans['state'].tolist(), ['a', 'b', 'UNDEFINED', 'c'])
+
+    def test_span_index(self):
+        begs = pd.Series(pd.to_datetime(['2015-1-3', '2015-1-1', '2015-1-5']))
+        ends = pd.Series(pd.to_datetime(['2015-1-4', '2015-1-3', '2015-1-6']))
+        index = SpanIndex(begs, ends)
+        self.assertFalse(index.overlapping)
+        ts = pd.to_datetime(['2015-1-1', '2015-1-3', '2015-1-4', '2015-1-5 12:00', '2014-1-1'])
+        np.testing.assert_array_equal(index.lookup(ts), [1, 0, -1, 2, -1])
+        queries, spans = index.stab(ts)
+        np.testing.assert_array_equal(queries, [0, 1, 3])
+        np.testing.assert_array_equal(spans, [1, 0, 2])
+        queries, spans = index.window(pd.to_datetime(['2015-1-2', '2015-1-4']), pd.to_datetime(['2015-1-3 12:00', '2015-1-5']))
+        np.testing.assert_array_equal(queries, [0, 0])
+        np.testing.assert_array_equal(spans, [0, 1])
+
+        index = SpanIndex(pd.concat([begs, ends.iloc[:1] - pd.Timedelta('2d')]), pd.concat([ends, ends.iloc[:1] + pd.Timedelta('2d')]))
+        self.assertTrue(index.overlapping)
+        with self.assertRaises(OverlapError):
+            index.lookup(ts)
+        queries, spans = index.stab(ts)
+        np.testing.assert_array_equal(queries, [0, 1, 1, 2, 3, 3])
+        np.testing.assert_array_equal(spans, [1, 0, 3, 3, 2, 3])
+
+    def test_merge_spans(self):
+        stamps = pd.DataFrame({
+            'ts': pd.date_range('2015-1-1', periods=5, freq='h'),
+            'temp': [0., 1., np.nan, 3., 4.],
+        })
+        spans = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2014-12-31', '2015-1-1 00:30', '2015-1-1 03:00']),
+            'ts_end': pd.to_datetime(['2015-1-1 00:30', '2015-1-1 02:30', '2015-1-1 06:00']),
+            'state': ['a', 'b', 'c'],
+        })
+        merged = merge_spans(stamps, spans, ['temp'])
+        self.assertEqual(merged['temp_beg'].tolist(), [0., .5, 3.])
+        self.assertEqual(merged['temp_end'].tolist(), [.5, 2.5, 4.])
+        self.assertEqual(merge_stamps(stamps, spans, ['state'])['state'].tolist(), ['a', 'b', 'b', 'c', 'c'])
+        self.assertEqual(merge_stamps(stamps, spans.iloc[1:2], ['state'])['state'].isnull().tolist(), [True, False, False, True, True])
+
+    def test_timespan_set_operations(self):
+        running = pd.DataFrame({
+            'machine': ['a', 'a', 'b'],
+            'ts_beg': pd.to_datetime(['2015-1-1 08:00', '2015-1-1 13:00', '2015-1-1 09:00']),
+            'ts_end': pd.to_datetime(['2015-1-1 12:00', '2015-1-1 18:00', '2015-1-1 10:00']),
+        })
+        maintenance = pd.DataFrame({
+            'machine': ['a', 'b'],
+            'ts_beg': pd.to_datetime(['2015-1-1 11:00', '2015-1-1 10:00']),
+            'ts_end': pd.to_datetime(['2015-1-1 14:00', '2015-1-1 11:00']),
+        })
+
+        def spans(machines, begs, ends):
+            return pd.DataFrame({'machine': machines, 'ts_beg': pd.to_datetime(begs), 'ts_end': pd.to_datetime(ends)})
+
+        pd.util.testing.assert_frame_equal(
+            union_timespans(running, maintenance, kind='machine'),
+            spans(['a', 'b'], ['2015-1-1 08:00', '2015-1-1 09:00'], ['2015-1-1 18:00', '2015-1-1 11:00'])
+        )
+        pd.util.testing.assert_frame_equal(
+            intersect_timespans(running, maintenance, kind='machine'),
+            spans(['a', 'a'], ['2015-1-1 11:00', '2015-1-1 13:00'], ['2015-1-1 12:00', '2015-1-1 14:00'])
+        )
+        pd.util.testing.assert_frame_equal(
+            subtract_timespans(running, maintenance, kind='machine'),
+            spans(['a', 'a', 'b'], ['2015-1-1 08:00', '2015-1-1 14:00', '2015-1-1 09:00'], ['2015-1-1 11:00', '2015-1-1 18:00', '2015-1-1 10:00'])
+        )
+        pd.util.testing.assert_frame_equal(
+            complement_timespans(running, kind='machine'),
+            spans(['a'], ['2015-1-1 12:00'], ['2015-1-1 13:00'])
+        )
+        pd.util.testing.assert_frame_equal(
+            complement_timespans(running, beg=pd.Timestamp('2015-1-1'), end=pd.Timestamp('2015-1-2')),
+            spans(['a'] * 3, ['2015-1-1 00:00', '2015-1-1 12:00', '2015-1-1 18:00'], ['2015-1-1 08:00', '2015-1-1 13:00', '2015-1-2 00:00'])[['ts_beg', 'ts_end']]
+        )
+
     def test_compute_segments(self):
         df = pd.DataFrame({
             'a': [0, 1, 1, 2],
@@ -133,6 +335,183 @@ class TimespanCase(unittest.TestCase):
             compute_segments(df, ['a', 'b']),
             pd.Series([1, 2, 3, 4])
         )
+        df = pd.DataFrame({
+            'ts': pd.date_range('2015-1-1', freq='h', periods=6),
+            'a': [0, np.nan, np.nan, 1, 1, 1],
+            'b': ['x', 'x', 'x', 'x', None, None],
+        })
+        pd.util.testing.assert_series_equal(compute_segments(df, ['a', 'b']), pd.Series([1, 2, 2, 3, 4, 4]))
+        pd.util.testing.assert_frame_equal(
+            compute_segment_table(df, ['a', 'b']),
+            pd.DataFrame({
+                'i_beg': [0, 1, 3, 4],
+                'i_end': [0, 2, 3, 5],
+                'ts_beg': pd.to_datetime(['2015-1-1 00:00', '2015-1-1 01:00', '2015-1-1 03:00', '2015-1-1 04:00']),
+                'ts_end': pd.to_datetime(['2015-1-1 01:00', '2015-1-1 03:00', '2015-1-1 04:00', '2015-1-1 05:00']),
+                'a': [0, np.nan, 1, 1],
+                'b': ['x', 'x', 'x', None],
+            }, columns=['i_beg', 'i_end', 'ts_beg', 'ts_end', 'a', 'b'])
+        )
+
+    def test_merge_overlapping_events(self):
+        df = pd.DataFrame({
+            'job': list('abcdefg'),
+            'ts_beg': pd.to_datetime(['2014-9-12 14:00', '2014-9-12 12:00', '2014-9-12 13:00', '2014-9-12 15:00', '2014-9-12 22:00', '2014-9-12 23:15', '2014-9-12 23:00']),
+            'ts_end': pd.to_datetime(['2014-9-12 15:00', '2014-9-12 12:30', '2014-9-12 15:30', '2014-9-12 16:00', '2014-9-12 23:00', '2014-9-12 23:16', '2014-9-12 23:50']),
+        })
+        pd.util.testing.assert_frame_equal(
+            merge_overlapping_events(df, 'ts_beg', 'ts_end'),
+            pd.DataFrame({
+                'job': list('bceg'),
+                'ts_beg': pd.to_datetime(['2014-9-12 12:00', '2014-9-12 13:00', '2014-9-12 22:00', '2014-9-12 23:00']),
+                'ts_end': pd.to_datetime(['2014-9-12 12:30', '2014-9-12 16:00', '2014-9-12 23:00', '2014-9-12 23:50']),
+            })
+        )
+        self.assertTrue(merge_overlapping_events(df.iloc[:0], 'ts_beg', 'ts_end').empty)
+
+    def test_merge_overlapping_events_kind(self):
+        df = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2014-9-12 12:00', '2014-9-12 13:00', '2014-9-12 14:00', '2014-9-12 15:00', '2014-9-12 17:00']),
+            'ts_end': pd.to_datetime(['2014-9-12 12:30', '2014-9-12 15:30', '2014-9-12 15:00', '2014-9-12 17:01', '2014-9-12 18:00']),
+            'category': [2, 1, 1, 2, 2],
+            'subcategory': ['a', 'a', 'a', 'b', 'b'],
+        })
+        expected = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2014-9-12 13:00', '2014-9-12 12:00', '2014-9-12 15:00']),
+            'ts_end': pd.to_datetime(['2014-9-12 15:30', '2014-9-12 12:30', '2014-9-12 18:00']),
+            'category': [1, 2, 2],
+            'subcategory': ['a', 'a', 'b'],
+        })
+        pd.util.testing.assert_frame_equal(merge_overlapping_events_kind(df, 'ts_beg', 'ts_end', ['category', 'subcategory']), expected)
+        pd.util.testing.assert_frame_equal(
+            merge_overlapping_events(df, 'ts_beg', 'ts_end', 'category'),
+            pd.DataFrame({
+                'category': [1, 2, 2],
+                'subcategory': ['a', 'a', 'b'],
+                'ts_beg': pd.to_datetime(['2014-9-12 13:00', '2014-9-12 12:00', '2014-9-12 15:00']),
+                'ts_end': pd.to_datetime(['2014-9-12 15:30', '2014-9-12 12:30', '2014-9-12 18:00']),
+            })
+        )
+
+    def test_timespans(self):
+        df = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2014-9-12 12:00', '2014-9-12 13:00', '2014-9-12 14:00', '2014-9-12 15:00', '2014-9-12 17:00']),
+            'ts_end': pd.to_datetime(['2014-9-12 12:30', '2014-9-12 15:30', '2014-9-12 15:00', '2014-9-12 17:01', '2014-9-12 18:00']),
+            'state': ['b', 'a', 'a', 'b', 'b'],
+        })
+        spans = Timespans.from_frame(df, state_col='state')
+        self.assertEqual(len(spans), 5)
+        self.assertTrue(np.shares_memory(spans.begs, df['ts_beg'].values))
+        frame = spans.to_frame()
+        pd.util.testing.assert_frame_equal(frame[['ts_beg', 'ts_end']], df[['ts_beg', 'ts_end']])
+        self.assertEqual(frame['state'].tolist(), df['state'].tolist())
+        with self.assertRaises(OverlapError):
+            spans.audit()
+        pd.util.testing.assert_series_equal(spans.describe(), describe_timespan(df['ts_beg'], df['ts_end']))
+        self.assertEqual(
+            spans.clean_overlap().to_frame()['ts_end'].tolist(),
+            clean_overlap_timespan(df['ts_beg'], df['ts_end']).tolist()
+        )
+        spans.clean_overlap().audit()
+        merged = spans.merge_overlapping(by_state=True).to_frame()
+        expected = merge_overlapping_events(df, 'ts_beg', 'ts_end', 'state')
+        pd.util.testing.assert_frame_equal(merged[['ts_beg', 'ts_end']], expected[['ts_beg', 'ts_end']])
+        self.assertEqual(merged['state'].tolist(), expected['state'].tolist())
+        self.assertEqual(len(spans.merge_overlapping()), 2)
+
+    def test_add_time_between_events(self):
+        df = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2014-9-12 15:00', '2014-9-12 12:00', '2014-9-12 13:00', '2014-9-12 22:00', '2014-9-12 23:15']),
+            'ts_end': pd.to_datetime(['2014-9-12 16:00', '2014-9-12 12:30', '2014-9-12 15:30', '2014-9-12 23:00', '2014-9-12 23:16']),
+            'category': [2, 1, 1, 2, 2],
+        })
+        ddf = add_time_between_events(df, 'ts_beg', 'ts_end', ['category'])
+        self.assertEqual(ddf['category'].tolist(), [1, 1, 2, 2, 2])
+        pd.util.testing.assert_series_equal(
+            ddf['time_since_previous'],
+            pd.Series(pd.to_timedelta([None, '30min', None, '6h', '15min']), name='time_since_previous')
+        )
+        pd.util.testing.assert_series_equal(
+            ddf['time_to_next'],
+            pd.Series(pd.to_timedelta(['30min', None, '6h', '15min', None]), name='time_to_next')
+        )
+        pd.util.testing.assert_frame_equal(
+            time_between_events_stats(df, 'ts_beg', 'ts_end', 'category', threshold='1h'),
+            pd.DataFrame({
+                'category': [1, 2],
+                'count': [2, 3],
+                'min': pd.to_timedelta(['30min', '15min']),
+                'median': pd.to_timedelta(['30min', '3h07min30s']),
+                'max': pd.to_timedelta(['30min', '6h']),
+                'above_threshold': [0, 1],
+            }, columns=['category', 'count', 'min', 'median', 'max', 'above_threshold'])
+        )
+        for kind in [None, 'category']:
+            ddf = add_time_between_events(df.iloc[:0], 'ts_beg', 'ts_end', kind)
+            self.assertEqual(len(ddf), 0)
+            self.assertEqual(ddf.columns.tolist()[-2:], ['time_since_previous', 'time_to_next'])
+            self.assertEqual(len(time_between_events_stats(df.iloc[:0], 'ts_beg', 'ts_end', kind)), 0)
+
+    def test_by_kind(self):
+        df = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2014-9-12 12:00', '2014-9-12 13:00', '2014-9-12 14:00', '2014-9-12 15:00', '2014-9-12 17:00', '2014-9-12 18:00']),
+            'ts_end': pd.to_datetime(['2014-9-12 12:30', '2014-9-12 15:30', '2014-9-12 15:00', '2014-9-12 17:01', '2014-9-12 18:00', '2014-9-12 19:00']),
+            'machine': ['b', 'a', 'a', 'b', 'b', 'c'],
+        })
+        self.assertEqual([part['machine'].tolist() for part in partition_by_kind(df, ['machine'], 2)], [['a', 'a'], ['b', 'b', 'b', 'c']])
+        for n_jobs in (1, 2):
+            pd.util.testing.assert_frame_equal(
+                merge_overlapping_events_kind(df, 'ts_beg', 'ts_end', 'machine', n_jobs=n_jobs),
+                merge_overlapping_events_kind(df, 'ts_beg', 'ts_end', 'machine')
+            )
+            description = describe_timespan_by_kind(df, 'machine', n_jobs=n_jobs)
+            self.assertEqual(description['machine'].tolist(), ['a', 'b', 'c'])
+            pd.util.testing.assert_series_equal(
+                description.iloc[1, 1:],
+                describe_timespan(df['ts_beg'][[0, 3, 4]].reset_index(drop=True), df['ts_end'][[0, 3, 4]].reset_index(drop=True)),
+                check_names=False
+            )
+            report = audit_timespan_report_by_kind(df, 'machine', n_jobs=n_jobs)
+            self.assertEqual(report[['machine', 'row', 'error']].values.tolist(), [['a', 1, 'OverlapError'], ['b', 2, 'OverlapError']])
+        # No rows, or no kind to partition the rows by
+        for frame in [df.iloc[:0], df.assign(machine=None)]:
+            for func, args in [
+                (describe_timespan_by_kind, (frame, 'machine')),
+                (audit_timespan_report_by_kind, (frame, 'machine')),
+                (merge_overlapping_events_kind, (frame, 'ts_beg', 'ts_end', 'machine')),
+                (add_time_between_events, (frame, 'ts_beg', 'ts_end', 'machine')),
+            ]:
+                result = func(*args, n_jobs=2)
+                self.assertEqual(len(result), 0)
+                pd.util.testing.assert_frame_equal(result, func(*args))
+
+
+class ChartingCase(unittest.TestCase):
+    def test_aggregate_pixels(self):
+        # Spans narrower than a pixel touching columns 60 and 61 are merged, not the one at 70
+        positions, x0, x1 = _aggregate_pixels(np.array([0, .6, .6001, .61, .7]), np.array([.5, .6005, .602, .6105, .7001]), 100)
+        np.testing.assert_array_equal(positions, [0, 1, 4])
+        np.testing.assert_allclose(x0, [0, .6, .7])
+        np.testing.assert_allclose(x1, [.5, .62, .71])
+
+    @unittest.skipIf(matplotlib is None, 'matplotlib is not installed')
+    def test_plot_events(self):
+        begs = pd.to_datetime(['2015-01-01', '2015-01-02', '2015-01-04'])
+        ends = pd.to_datetime(['2015-01-02', '2015-01-03', '2015-01-05'])
+        inputs = [
+            ([0, 1, 3], [1, 2, 4]),
+            (begs.values, ends.values),
+            (begs, ends),
+            (pd.Series(begs), pd.Series(ends)),
+            (pd.Series(begs, index=[10, 11, 12]), pd.Series(ends, index=[10, 11, 12])),
+            (list(begs), list(ends)),
+        ]
+        for xmin, xmax in inputs:
+            plot_events(['a', 'b', 'a'], xmin, xmax, labels=pd.Series(['x', 'y', 'z'], index=[10, 11, 12]))
+            ax = plt.gca()
+            self.assertEqual([c.get_segments()[0][:, 0].tolist() for c in ax.collections], [[0, .25], [.25, .5]])
+            self.assertEqual([t.get_text() for t in ax.texts], ['x', 'z', 'y'])
+            plt.close('all')
 
 
 class CoreCase(unittest.TestCase):
@@ -146,3 +525,183 @@ class CoreCase(unittest.TestCase):
         w = pd.Series([0, 1, 0, 1, 1, 2, 0, 1])
         r = pd.Series([0, .5, .5, 1, 1.25, 1.75, 1.75, 2])
         pd.util.testing.assert_series_equal(weighted_interpolate(s, w), r)
+        df = pd.DataFrame({
+            'a': s,
+            'b': [np.nan, 0, np.nan, np.nan, np.nan, 1, np.nan, np.nan],
+            'c': np.nan,
+        })
+        expected = pd.DataFrame({
+            'a': r,
+            'b': [np.nan, 0, 0, .25, .5, 1, np.nan, np.nan],
+            'c': np.nan,
+        })
+        pd.util.testing.assert_frame_equal(weighted_interpolate_frame(df, w), expected)
+        self.assertIsNone(weighted_interpolate_frame(df, w, inplace=True))
+        pd.util.testing.assert_frame_equal(df, expected)
+
+
+class TimestampsCase(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame(
+            {'data': [0, np.nan, np.nan, 3, 4, np.nan, 6, np.nan, np.nan, np.nan]},
+            index=pd.date_range('2015-9-1', freq='d', periods=10)
+        )
+
+    def test_find_holes(self):
+        holes = find_hole_indices(self.df)
+        self.assertEqual(len(holes), 3)
+        self.assertEqual(len(find_hole_indices(self.df.fillna(0))), 0)
+        np.testing.assert_array_equal(holes.i_beg, [1, 5, 7])
+        np.testing.assert_array_equal(holes.i_end, [2, 5, 9])
+        np.testing.assert_array_equal(holes.length, [2, 1, 3])
+        pd.util.testing.assert_frame_equal(
+            find_holes(self.df),
+            pd.DataFrame({
+                'ts_beg': pd.to_datetime(['2015-9-2', '2015-9-6', '2015-9-8']),
+                'ts_end': pd.to_datetime(['2015-9-3', '2015-9-6', '2015-9-10']),
+                'length': [2, 1, 3],
+                'i_beg': [1, 5, 7],
+                'i_end': [2, 5, 9],
+            }, columns=['ts_beg', 'ts_end', 'length', 'i_beg', 'i_end'])
+        )
+        self.assertEqual(len(find_holes(self.df.fillna(0))), 0)
+
+    def test_cut(self):
+        time_series = cut(self.df, min_hole_duration=1)
+        self.assertEqual([len(ts) for ts in time_series], [1, 4])
+        self.assertEqual(time_series[1].index[0], pd.Timestamp('2015-9-4'))
+        self.assertEqual(len(cut(self.df, min_hole_duration=2)), 1)
+        self.assertEqual(list(cut(self.df, min_hole_duration=1, lazy=True)), [slice(0, 1), slice(3, 7)])
+
+    def test_cut_fixed_size(self):
+        df = pd.DataFrame({'data': np.arange(8.)}, index=pd.date_range('2015-9-1', freq='d', periods=8))
+        time_series = cut_fixed_size(df, size=4, overlap=2)
+        self.assertEqual([ts['data'].tolist() for ts in time_series], [[0, 1, 2, 3], [2, 3, 4, 5], [4, 5, 6, 7]])
+        windows, begs = cut_fixed_size(df, size=4, overlap=2, as_array=True)
+        np.testing.assert_array_equal(windows, [[0, 1, 2, 3], [2, 3, 4, 5], [4, 5, 6, 7]])
+        np.testing.assert_array_equal(begs, pd.to_datetime(['2015-9-1', '2015-9-3', '2015-9-5']).values)
+        self.assertTrue(np.shares_memory(windows, df.values))
+        self.assertEqual(cut_fixed_size(df, size=10, overlap=2), [])
+
+    def test_fill_data(self):
+        np.testing.assert_array_equal(fill_data(self.df, 2)['data'].values, [0, 1, 2, 3, 4, 5, 6, np.nan, np.nan, np.nan])
+        np.testing.assert_array_equal(fill_data(self.df, 3)['data'].values, [0, 1, 2, 3, 4, 5, 6, 6, 6, 6])
+        np.testing.assert_array_equal(fill_data(self.df, 3, method='previous')['data'].values, [0, 0, 0, 3, 4, 4, 6, 6, 6, 6])
+        np.testing.assert_array_equal(fill_data(self.df, 3, method='nearest')['data'].values, [0, 0, 3, 3, 4, 4, 6, 6, 6, 6])
+        df = self.df.iloc[:4]
+        np.testing.assert_array_equal(fill_data(df, 2, method='time')['data'].values, [0, 1, 2, 3])
+        df = pd.DataFrame({'data': [0, np.nan, np.nan, 5]}, index=pd.to_datetime(['2015-01-01 00:00:00', '2015-01-01 00:00:01', '2015-01-01 00:00:04', '2015-01-01 00:00:05']))
+        np.testing.assert_array_equal(fill_data(df, 2, method='time')['data'].values, [0, 1, 4, 5])
+        with self.assertRaises(TimeStepError):
+            fill_data(df, 2)
+        with self.assertRaises(ValueError):
+            fill_data(self.df, 3, method='spline')
+
+    def test_timestamp_validator(self):
+        validator = TimestampValidator()
+        validator.check(self.df.index[:3])
+        validator.check(self.df.index[3])
+        with self.assertRaises(TimeStepError):
+            validator.check(self.df.index[5])
+        validator = TimestampValidator(time_step='1d', raise_errors=False)
+        for ts in self.df.index[[0, 1, 3, 2]]:
+            validator.check(ts)
+        self.assertEqual([(row, type(error)) for row, error in validator.errors], [(2, TimeStepError), (3, NotSortedError)])
+
+    def test_panel(self):
+        df = to_panel(pd.DataFrame({
+            'ts': np.concatenate([self.df.index, self.df.index]),
+            'sensor': ['a'] * 10 + ['b'] * 10,
+            'data': np.concatenate([self.df['data'].values, self.df['data'].values[::-1]]),
+        }), 'sensor')
+        self.assertEqual(df.columns.tolist(), ['a', 'b'])
+        audit_panel(df)
+        df['c'] = np.nan
+        with self.assertRaises(MissingDataError):
+            audit_panel(df)
+        holes = find_holes_panel(df)
+        self.assertEqual(holes['series'].tolist(), ['a', 'a', 'a', 'b', 'b', 'b', 'c'])
+        pd.util.testing.assert_frame_equal(holes.iloc[:3].drop('series', axis=1), find_holes(self.df))
+        trimmed = trim_panel(df)
+        self.assertEqual(trimmed.groupby('series').size().to_dict(), {'a': 7, 'b': 7})
+        filled = fill_data_panel(df.drop('c', axis=1), 3, method='nearest')
+        np.testing.assert_array_equal(filled['a'].values, fill_data(self.df, 3, method='nearest')['data'].values)
+        np.testing.assert_array_equal(filled['b'].values, [6, 6, 6, 6, 6, 4, 3, 3, 0, 0])
+        description = describe_panel(df)
+        self.assertEqual(description['# holes'].tolist(), [3, 3, 1])
+        self.assertEqual(description['max hole size'].tolist(), [3, 3, 10])
+
+    def test_n_jobs(self):
+        # Holes of 1 to 6 points cross the bounds of the chunks
+        df = pd.DataFrame({'data': np.arange(100.)}, index=pd.date_range('2015-01-01', periods=100, freq='s'))
+        df.iloc[np.r_[0:2, 24:27, 48:52, 70:76, 99]] = np.nan
+        pd.util.testing.assert_frame_equal(find_holes(df, n_jobs=4), find_holes(df))
+        for method in ['interpolate', 'time', 'previous', 'nearest']:
+            pd.util.testing.assert_frame_equal(fill_data(df, 5, method, n_jobs=4), fill_data(df, 5, method))
+        for actual, expected in zip(cut(df, 3, n_jobs=4), cut(df, 3)):
+            pd.util.testing.assert_frame_equal(actual, expected)
+        # Time steps are audited in the chunks, up to the bound of the last one
+        uneven = df.set_axis(df.index[:-1].append(pd.DatetimeIndex(['2015-01-01 00:02:00'])), axis=0)
+        with self.assertRaises(TimeStepError):
+            find_holes(uneven, n_jobs=4)
+        pd.util.testing.assert_frame_equal(fill_data(uneven, 5, 'time', n_jobs=4), fill_data(uneven, 5, 'time'))
+        with self.assertRaises(NotSortedError):
+            find_holes(df.iloc[::-1], n_jobs=4)
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class ParquetCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_spans(self):
+        df = pd.DataFrame({
+            'ts_beg': pd.to_datetime(['2015-01-01 00:00', '2015-01-01 01:00', '2015-01-01 00:30', '2015-01-01 02:00']),
+            'ts_end': pd.to_datetime(['2015-01-01 01:00', '2015-01-01 02:00', '2015-01-01 01:30', '2015-01-01 03:00']),
+            'state': ['on', 'off', 'on', 'on'],
+            'machine': ['a', 'a', 'b', 'b'],
+        })
+        path = os.path.join(self.directory, 'spans.parquet')
+        write_spans(df, path, kind='machine', row_group_size=2)
+        spans = read_spans(path, categorical=False)
+        self.assertEqual(spans.columns.tolist(), ['machine', 'ts_beg', 'ts_end', 'state'])
+        pd.util.testing.assert_frame_equal(spans[df.columns], df)
+        spans = read_spans(path, start='2015-01-01 01:15', end='2015-01-01 02:30', kind='machine', kinds=['b'], categorical=False)
+        self.assertEqual(spans['state'].tolist(), ['on', 'on'])
+        self.assertEqual(read_spans(path)['state'].dtype.name, 'category')
+        # Several kind columns: the spans of the given (machine, line) couples only
+        df['line'] = [1, 2, 1, 2]
+        write_spans(df, path, kind=['machine', 'line'], row_group_size=2)
+        for categorical in (True, False):
+            spans = read_spans(path, columns=['state'], kind=['machine', 'line'], kinds=[('a', 1), ('b', 2)], categorical=categorical)
+            self.assertEqual(spans.columns.tolist(), ['state'])
+            self.assertEqual(spans['state'].tolist(), ['on', 'on'])
+        self.assertEqual(len(read_spans(path, kind=['machine', 'line'], kinds=[])), 0)
+        with self.assertRaises(ValueError):
+            read_spans(path, kind=['machine', 'line'], kinds=['a'])
+
+    def test_stamps(self):
+        df = pd.DataFrame({'data': [0, np.nan, 2, 3]}, index=pd.date_range('2015-01-01', periods=4, freq='s'))
+        path = os.path.join(self.directory, 'stamps.parquet')
+        write_stamps(df, path)
+        pd.util.testing.assert_frame_equal(read_stamps(path), df, check_freq=False)
+        pd.util.testing.assert_frame_equal(read_stamps(path, '2015-01-01 00:00:01', '2015-01-01 00:00:03'), df.iloc[1:3], check_freq=False)
+
+
+class ImportCase(unittest.TestCase):
+    def test_import_time(self):
+        code = (
+            'import sys, time; t = time.time(); '
+            'import chrony.charting, chrony.core, chrony.parquet, chrony.timespans, chrony.timestamps; '
+            'print(time.time() - t, "matplotlib" in sys.modules, "pyarrow.parquet" in sys.modules)'
+        )
+        # pandas may import pyarrow by itself, but not pyarrow.parquet
+        duration, matplotlib, parquet = subprocess.check_output(
+            [sys.executable, '-c', code], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).decode().split()
+        self.assertEqual(matplotlib, 'False')
+        self.assertEqual(parquet, 'False')
+        self.assertLess(float(duration), IMPORT_TIME_BUDGET)
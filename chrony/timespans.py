@@ -2,43 +2,268 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import numpy as np
 import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import Tick
 
+from .core import as_datetime_index, _expand_ranges, _kind_codes
+from .parallel import apply_by_kind, n_workers
 from .exceptions import BadLengthsError, BegPosteriorToEndError, OverlapError, NotSortedError, IntegrityError, HasTimezoneError
 
 
-def audit_timespan(begs, ends):
+def _asi8(values):
+    '''
+    Returns an int64 view of datetime-like values, other values are returned as is.
+    '''
+    values = np.asarray(values)
+    if values.dtype.kind in 'mM':
+        return values.view('i8')
+    return values
+
+
+def _from_asi8(values, dtype):
+    '''
+    Reverts _asi8 given the dtype of the original values.
+    '''
+    if dtype.kind in 'mM':
+        return values.view(dtype)
+    return values
+
+
+def _kind_list(kind):
+    '''
+    Returns the list of kind columns given None, a column name or a list of column names.
+    '''
+    if kind is None:
+        return []
+    if isinstance(kind, (list, tuple)):
+        return list(kind)
+    return [kind]
+
+
+def _argsort_codes(codes, order=None):
+    '''
+    Returns the indices sorting the non-negative integer codes, stable with respect to order
+    (the indices of a previous sort) if given. Sorts by 16 bits digits, for which NumPy
+    uses a radix sort.
+    '''
+    order = np.arange(len(codes)) if order is None else order
+    top = codes[order].max() if len(order) else 0
+    shift = 0
+    while True:
+        digits = (codes[order] >> shift) & 0xFFFF
+        order = order[np.argsort(digits.astype(np.uint16), kind='stable')]
+        shift += 16
+        if not top >> shift:
+            return order
+
+
+def _kind_starts(df, kind):
+    '''
+    Given a frame sorted by the columns in kind, returns a boolean mask flagging the rows
+    where the kind changes.
+    '''
+    starts = np.zeros(len(df), dtype=bool)
+    if len(df):
+        starts[0] = True
+    for column in kind:
+        codes = pd.factorize(df[column])[0]
+        starts[1:] |= codes[1:] != codes[:-1]
+    return starts
+
+
+def _merge_group_starts(begs, ends, kind_starts=None):
+    '''
+    Given events sorted by begs (within each kind if kind_starts is given), returns a
+    boolean mask flagging the first event of each group of overlapping events: an event
+    starts a new group iff no previous event of its kind ends strictly after its beginning.
+    '''
+    starts = np.ones(len(begs), dtype=bool)
+    if len(begs) > 1:
+        if kind_starts is None:
+            running_ends = np.maximum.accumulate(ends)
+        else:
+            running_ends = pd.Series(ends).groupby(np.cumsum(kind_starts)).cummax().values
+        starts[1:] = running_ends[:-1] <= begs[1:]
+        if kind_starts is not None:
+            starts |= kind_starts
+    return starts
+
+
+def _audit_timespan(begs, ends, stop_at_first=False):
+    '''
+    Runs the checks of audit_timespan as vectorized comparisons on int64 views and returns
+    the list of (error, rows, amounts) of the failed checks, in the order audit_timespan
+    raises them. rows is -1 and amounts is None for errors on the whole series.
+    '''
+    violations = []
     if begs.empty and ends.empty:
-        return
+        return violations
     if begs.dt.tz or ends.dt.tz:
-        raise HasTimezoneError
+        violations.append((HasTimezoneError, np.array([-1]), None))
+        if stop_at_first:
+            return violations
     if len(begs) != len(ends):
-        raise BadLengthsError
-    for beg, end in zip(begs, ends):
-        if beg > end:
-            raise BegPosteriorToEndError
-    if (begs < begs.shift()).sum():
-        raise NotSortedError
-    if (ends.shift() > begs)[1:].sum():
-        raise OverlapError
+        violations.append((BadLengthsError, np.array([-1]), None))
+        return violations
+    return violations + _audit_timespan_values(_asi8(begs.values), _asi8(ends.values), stop_at_first)
+
+
+def _audit_timespan_values(b, e, stop_at_first=False):
+    '''
+    Runs the checks on the order of the int64 begs b and ends e, see _audit_timespan.
+    '''
+    violations = []
+    checks = (
+        # (error, left, right, offset): row i + offset violates the check iff left[i] > right[i]
+        (BegPosteriorToEndError, b, e, 0),
+        (NotSortedError, b[:-1], b[1:], 1),
+        (OverlapError, e[:-1], b[1:], 1),
+    )
+    for error, left, right, offset in checks:
+        rows = np.flatnonzero(left > right)
+        if len(rows):
+            if stop_at_first:
+                rows = rows[:1]
+            violations.append((error, rows + offset, left[rows] - right[rows]))
+            if stop_at_first:
+                break
+    return violations
+
+
+def audit_timespan(begs, ends):
+    violations = _audit_timespan(begs, ends, stop_at_first=True)
+    if violations:
+        raise violations[0][0]
+
+
+def audit_timespan_report(begs, ends, stop_at_first=False):
+    '''
+    Makes the same verifications as audit_timespan but returns a frame with one row per
+    violation instead of raising:
+    - row: position of the offending span (-1 for errors on the whole series)
+    - error: name of the exception audit_timespan would raise
+    - amount: by how much the span violates the check (eg the overlap with the previous span)
+    If stop_at_first is True, only the first violation audit_timespan would raise is reported.
+    '''
+    violations = _audit_timespan(begs, ends, stop_at_first)
+    dtype = np.asarray(begs.values).dtype
+    if dtype.kind == 'M':
+        missing = np.iinfo('i8').min  # NaT
+    else:
+        missing = np.nan
+    rows, errors, amounts = [np.array([], dtype='i8')], [np.array([], dtype=object)], [np.array([], dtype=np.asarray(missing).dtype)]
+    for error, error_rows, error_amounts in violations:
+        rows.append(error_rows)
+        errors.append(np.full(len(error_rows), error.__name__, dtype=object))
+        amounts.append(np.full(len(error_rows), missing) if error_amounts is None else error_amounts)
+    amounts = np.concatenate(amounts)
+    if dtype.kind == 'M':
+        amounts = amounts.view('m8[%s]' % np.datetime_data(dtype)[0])
+    return pd.DataFrame({
+        'row': np.concatenate(rows),
+        'error': np.concatenate(errors),
+        'amount': amounts,
+    }, columns=['row', 'error', 'amount'])
 
 
 def audit_timespan_print(begs, ends):
-    if begs.dt.tz or ends.dt.tz:
-        print('')
-        print('TimeZoneError')
-    if len(begs) != len(ends):
-        print('')
-        print('TimeZoneError')
-    for beg, end in zip(begs, ends):
-        if beg > end:
+    report = audit_timespan_report(begs, ends)
+    for row, error, amount in zip(report['row'], report['error'], report['amount']):
+        if error == 'BegPosteriorToEndError':
             print('')
-            print('beg=', beg, ' posterior to end=', end)
-    for i in range(len(begs) - 1):
-        if begs[i + 1] < begs[i]:
+            print('beg=', begs.iloc[row], ' posterior to end=', ends.iloc[row])
+        elif error == 'NotSortedError':
             print('Events are not sorted')
-        if ends[i] > begs[i + 1]:
-            print('At row %s end %s is posterior to %s by %s' % (i, ends[i], begs[i + 1], ends[i] - begs[i + 1]))
+        elif error == 'OverlapError':
+            print('At row %s end %s is posterior to %s by %s' % (row - 1, ends.iloc[row - 1], begs.iloc[row], amount))
+        else:
+            print('')
+            print(error)
+
+
+def audit_timespan_chunks(chunks, beg_col='ts_beg', end_col='ts_end'):
+    '''
+    Makes the same verifications as audit_timespan on spans read by chunks (eg using
+    pd.read_csv(..., chunksize=...)) and raises the same error. Only the last span of the
+    previous chunk is kept in memory.
+    '''
+    errors = (HasTimezoneError, BadLengthsError, BegPosteriorToEndError, NotSortedError, OverlapError)
+    error, previous = None, None
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        begs, ends = chunk[beg_col], chunk[end_col]
+        if previous is not None:
+            begs = pd.concat([previous[beg_col], begs])
+            ends = pd.concat([previous[end_col], ends])
+        violations = _audit_timespan(begs, ends, stop_at_first=True)
+        if violations and (error is None or errors.index(violations[0][0]) < errors.index(error)):
+            error = violations[0][0]
+        previous = chunk.iloc[-1:]
+    if error is not None:
+        raise error
+
+
+class TimespanValidator(object):
+    '''
+    Validates a stream of spans record by record (or by micro-batch) against the previous
+    span only, making the same verifications as audit_timespan in O(1) per span. Errors are
+    raised, or collected in errors as (row, exception) couples if raise_errors is False.
+    '''
+
+    def __init__(self, raise_errors=True):
+        self.raise_errors = raise_errors
+        self.errors = []
+        self.count = 0
+        self.last_beg, self.last_end = None, None
+
+    def _fail(self, errors):
+        errors.sort(key=lambda error: error[0])
+        if self.raise_errors:
+            raise errors[0][1]
+        self.errors.extend(errors)
+
+    def check(self, begs, ends):
+        '''
+        Validates one span (begs and ends being timestamps) or a batch of spans.
+        '''
+        begs, ends = as_datetime_index(begs), as_datetime_index(ends)
+        if len(begs) != len(ends):
+            return self._fail([(self.count, BadLengthsError('Batch at row %s' % self.count))])
+        errors = []
+        if begs.tz or ends.tz:
+            errors.append((self.count, HasTimezoneError('Batch at row %s' % self.count)))
+        b, e = begs.asi8, ends.asi8
+        for row in np.flatnonzero(b > e):
+            errors.append((self.count + row, BegPosteriorToEndError('At row %s' % (self.count + row))))
+        if self.count:
+            b, e = np.concatenate([[self.last_beg], b]), np.concatenate([[self.last_end], e])
+        offset = self.count - 1 if self.count else 0
+        for row in np.flatnonzero(b[1:] < b[:-1]):
+            errors.append((offset + row + 1, NotSortedError('At row %s' % (offset + row + 1))))
+        for row in np.flatnonzero(e[:-1] > b[1:]):
+            errors.append((offset + row + 1, OverlapError('At row %s' % (offset + row + 1))))
+        if errors:
+            self._fail(errors)
+        if len(b):
+            self.count += len(begs)
+            self.last_beg, self.last_end = b[-1], e[-1]
+
+
+def _describe_timespan(beg, end, count, contiguous_transitions, duration):
+    coverage = duration.total_seconds() / (end - beg).total_seconds()
+    metrics = (
+        ('beg', beg),
+        ('count', count),
+        ('contiguous transitions', contiguous_transitions),
+        ('not contiguous transitions', count - contiguous_transitions - 1),
+        ('coverage', coverage),
+        ('end', end)
+    )
+    retval = pd.Series([m[1] for m in metrics], index=[m[0] for m in metrics])
+    return retval
 
 
 def describe_timespan(begs, ends):
@@ -46,21 +271,290 @@ def describe_timespan(begs, ends):
         print('Empty series')
         return
     contiguous_transitions = (begs == ends.shift()).sum()
-    coverage = (ends - begs).sum().total_seconds() / (ends[len(ends) - 1] - begs[0]).total_seconds()
-    metrics = (
-        ('beg', begs[0]),
-        ('count', len(begs)),
-        ('contiguous transitions', contiguous_transitions),
-        ('not contiguous transitions', len(begs) - contiguous_transitions - 1),
-        ('coverage', coverage),
-        ('end', ends[len(ends) - 1])
+    return _describe_timespan(begs[0], ends[len(ends) - 1], len(begs), contiguous_transitions, (ends - begs).sum())
+
+
+class TimespanStats(object):
+    '''
+    Accumulator of the metrics of describe_timespan, updated batch by batch in O(batch) and
+    mergeable across consecutive partitions of spans. Durations are summarized in a
+    mergeable sketch (log-spaced buckets) giving percentiles within relative_accuracy.
+    '''
+
+    def __init__(self, relative_accuracy=.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.unit = None
+        self.beg, self.end = None, None
+        self.count, self.contiguous_transitions, self.duration = 0, 0, 0
+        self.zero_durations, self.buckets = 0, {}
+
+    def update(self, begs, ends):
+        '''
+        Adds spans following the ones already accumulated.
+        '''
+        if not len(begs):
+            return self
+        self.unit = np.datetime_data(np.asarray(begs).dtype)[0]
+        begs, ends = _asi8(begs), _asi8(ends)
+        if self.count:
+            self.contiguous_transitions += int(begs[0] == self.end)
+        else:
+            self.beg = begs[0]
+        self.contiguous_transitions += int((begs[1:] == ends[:-1]).sum())
+        self.count += len(begs)
+        self.end = ends[-1]
+        durations = ends - begs
+        self.duration += int(durations.sum())
+        positive = durations[durations > 0]
+        self.zero_durations += len(durations) - len(positive)
+        keys, counts = np.unique(np.ceil(np.log(positive) / np.log(self.gamma)).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        return self
+
+    def merge(self, other):
+        '''
+        Adds the metrics of other, accumulated on spans following the ones of self.
+        '''
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge TimespanStats of different relative accuracies')
+        if not other.count:
+            return self
+        if self.count:
+            self.contiguous_transitions += int(other.beg == self.end)
+        else:
+            self.beg, self.unit = other.beg, other.unit
+        self.contiguous_transitions += other.contiguous_transitions
+        self.count += other.count
+        self.end = other.end
+        self.duration += other.duration
+        self.zero_durations += other.zero_durations
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        return self
+
+    def percentile(self, q):
+        '''
+        Returns the estimated q-th percentile (0 <= q <= 100) of the span durations.
+        '''
+        rank = q / 100. * (self.count - 1)
+        if rank < self.zero_durations:
+            return pd.Timedelta(0, unit=self.unit)
+        keys = sorted(self.buckets)
+        ranks = self.zero_durations + np.cumsum([self.buckets[key] for key in keys])
+        key = keys[np.searchsorted(ranks, rank, side='right')]
+        # middle of the bucket (gamma ** (key - 1), gamma ** key] in relative terms
+        return pd.Timedelta(2 * self.gamma ** key / (self.gamma + 1), unit=self.unit)
+
+    def describe(self, percentiles=(25, 50, 75)):
+        '''
+        Returns the metrics of describe_timespan followed by the given duration percentiles.
+        '''
+        if not self.count:
+            print('Empty series')
+            return
+        retval = _describe_timespan(
+            pd.Timestamp(np.datetime64(int(self.beg), self.unit)),
+            pd.Timestamp(np.datetime64(int(self.end), self.unit)),
+            self.count,
+            self.contiguous_transitions,
+            pd.Timedelta(self.duration, unit=self.unit)
+        )
+        if len(percentiles):
+            retval = pd.concat([retval, pd.Series(
+                [self.percentile(q) for q in percentiles],
+                index=['duration %s%%' % q for q in percentiles]
+            )])
+        return retval
+
+
+def describe_timespan_chunks(chunks, beg_col='ts_beg', end_col='ts_end'):
+    '''
+    Returns the same metrics as describe_timespan on spans read by chunks (eg using
+    pd.read_csv(..., chunksize=...)). Only running sums and the boundary spans are kept in
+    memory.
+    '''
+    stats = TimespanStats()
+    for chunk in chunks:
+        stats.update(chunk[beg_col].values, chunk[end_col].values)
+    return stats.describe(percentiles=())
+
+
+def _describe_timespan_kinds(df, kind, beg_col, end_col):
+    '''
+    Returns the description of describe_timespan of each kind of df, computed with
+    reductions over the kinds.
+    '''
+    ddf, firsts, lasts = _sorted_events(df[kind + [beg_col, end_col]], None, kind)
+    begs, ends = ddf[beg_col], ddf[end_col]
+    groups = np.cumsum(firsts) - 1
+    count = np.bincount(groups)
+    contiguous_transitions = np.bincount(groups, weights=(begs == ends.shift()).values & ~firsts, minlength=len(count))
+    duration = pd.Series(_asi8((ends - begs).values)).groupby(groups).sum().values
+    beg, end = begs.values[firsts], ends.values[lasts]
+    retval = ddf.loc[firsts, kind].reset_index(drop=True)
+    retval['beg'] = beg
+    retval['count'] = count
+    retval['contiguous transitions'] = contiguous_transitions.astype(np.int64)
+    retval['not contiguous transitions'] = count - retval['contiguous transitions'] - 1
+    retval['coverage'] = duration / _asi8(end - beg).astype('d')
+    retval['end'] = end
+    return retval
+
+
+def _audit_timespan_report_kinds(df, kind, beg_col, end_col):
+    '''
+    Returns the reports of audit_timespan_report of each kind of df, computed with
+    comparisons between consecutive rows of the same kind.
+    '''
+    ddf, firsts, _ = _sorted_events(df[kind + [beg_col, end_col]], None, kind)
+    b, e = _asi8(ddf[beg_col].values), _asi8(ddf[end_col].values)
+    groups = np.cumsum(firsts) - 1
+    positions = np.arange(len(ddf)) - np.flatnonzero(firsts)[groups]
+    rows, errors, amounts = [], [], []
+    if getattr(ddf[beg_col].dtype, 'tz', None) or getattr(ddf[end_col].dtype, 'tz', None):
+        rows.append(np.flatnonzero(firsts))
+        errors.append(np.full(len(rows[-1]), HasTimezoneError.__name__, dtype=object))
+        amounts.append(np.full(len(rows[-1]), np.iinfo('i8').min))
+    follows = np.flatnonzero(~firsts)
+    checks = (
+        # (error, rows, left, right): a row violates the check iff left > right
+        (BegPosteriorToEndError, np.arange(len(b)), b, e),
+        (NotSortedError, follows, b[follows - 1], b[follows]),
+        (OverlapError, follows, e[follows - 1], b[follows]),
     )
-    retval = pd.Series([m[1] for m in metrics], index=[m[0] for m in metrics])
+    for error, check_rows, left, right in checks:
+        failed = left > right
+        rows.append(check_rows[failed])
+        errors.append(np.full(failed.sum(), error.__name__, dtype=object))
+        amounts.append(left[failed] - right[failed])
+    rows = np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+    order = np.argsort(groups[rows], kind='mergesort')
+    rows = rows[order]
+    retval = ddf[kind].iloc[rows].reset_index(drop=True)
+    retval['row'] = positions[rows]
+    retval['error'] = np.concatenate(errors)[order]
+    amounts = np.concatenate(amounts)[order]
+    dtype = np.asarray(ddf[beg_col].values).dtype
+    retval['amount'] = amounts.view('m8[%s]' % np.datetime_data(dtype)[0]) if dtype.kind == 'M' else amounts
     return retval
 
 
+def describe_timespan_by_kind(df, kind, beg_col='ts_beg', end_col='ts_end', n_jobs=1):
+    '''
+    Returns the description of describe_timespan of the spans of each kind of df (rows
+    sharing the values of the columns in kind), one row per kind sorted by kind. The kinds
+    are split between n_jobs processes.
+    '''
+    kind = _kind_list(kind)
+    return apply_by_kind(df, kind, _describe_timespan_kinds, n_jobs, kind=kind, beg_col=beg_col, end_col=end_col)
+
+
+def audit_timespan_report_by_kind(df, kind, beg_col='ts_beg', end_col='ts_end', n_jobs=1):
+    '''
+    Returns the reports of audit_timespan_report on the spans of each kind of df stacked
+    with the kind columns (row is the position of the span within its kind). The kinds are
+    split between n_jobs processes.
+    '''
+    kind = _kind_list(kind)
+    return apply_by_kind(df, kind, _audit_timespan_report_kinds, n_jobs, kind=kind, beg_col=beg_col, end_col=end_col)
+
+
+def _bin_edges(beg, end, freq):
+    '''
+    Returns the edges of the bins of frequency freq covering [beg, end).
+    '''
+    offset = to_offset(freq)
+    start = beg.floor(offset) if isinstance(offset, Tick) else offset.rollback(beg.normalize())
+    edges = pd.date_range(start, end, freq=offset)
+    if edges[-1] < end:
+        edges = edges.append(pd.DatetimeIndex([edges[-1] + offset]))
+    return edges
+
+
+def time_in_state(df, freq, state_columns, beg_col='ts_beg', end_col='ts_end'):
+    '''
+    Returns the time spent in each state (given by state_columns) within bins of frequency
+    freq (eg 'h', '8h', 'D', 'MS'), as a frame with the beginning of the bin (ts), the state
+    columns and the duration, sorted by bin then state, without the (bin, state) couples of
+    zero duration.
+    Spans are split at bin edges arithmetically: full bins are counted from the changes of
+    the number of spans covering them, so that memory depends on the number of spans and of
+    (bin, state) couples with a duration, not on durations or on the number of states
+    times the number of bins.
+    '''
+    columns = ['ts'] + list(state_columns) + ['duration']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    dtype = np.asarray(df[beg_col].values).dtype
+    if state_columns:
+        groups = df.groupby(list(state_columns)).ngroup().values
+    else:
+        groups = np.zeros(len(df), dtype=np.int64)
+    valid = (groups >= 0) & (df[end_col].values > df[beg_col].values)
+    begs, ends, groups = _asi8(df[beg_col].values)[valid], _asi8(df[end_col].values)[valid], groups[valid]
+    if not len(begs):
+        return pd.DataFrame(columns=columns)
+    n_groups = groups.max() + 1
+    # first row of each group, to get its state values
+    rows = np.zeros(n_groups, dtype=np.int64)
+    rows[groups[::-1]] = np.flatnonzero(valid)[::-1]
+    edges = _asi8(_bin_edges(pd.Timestamp(begs.min()), pd.Timestamp(ends.max()), freq).values)
+    n_bins = len(edges) - 1
+    first_bins = np.searchsorted(edges, begs, side='right') - 1
+    last_bins = np.searchsorted(edges, ends, side='left') - 1
+    # (bin, group) keys and durations, sorted by bin then state once aggregated
+    single = first_bins == last_bins
+    many = ~single
+    keys = [
+        first_bins[single] * n_groups + groups[single],
+        first_bins[many] * n_groups + groups[many],
+        last_bins[many] * n_groups + groups[many],
+    ]
+    durations = [
+        ends[single] - begs[single],
+        edges[first_bins[many] + 1] - begs[many],
+        ends[many] - edges[last_bins[many]],
+    ]
+    # Full bins between the first and last bins of spans over several bins: the count of
+    # spans of a group covering its bins changes at the (group, bin) events only, and the
+    # runs of bins covered at least once are expanded
+    events = np.concatenate([groups[many] * n_bins + first_bins[many] + 1, groups[many] * n_bins + last_bins[many]])
+    events, inverse = np.unique(events, return_inverse=True)
+    counts = np.zeros(len(events), dtype=np.int64)
+    np.add.at(counts, inverse, np.repeat([1, -1], many.sum()))
+    counts = np.cumsum(counts)
+    covered = np.flatnonzero(counts[:-1] > 0)
+    runs, event_keys = _expand_ranges(events[covered], events[covered + 1])
+    full_groups, full_bins = np.divmod(event_keys, n_bins)
+    keys.append(full_bins * n_groups + full_groups)
+    durations.append(counts[covered][runs] * (edges[full_bins + 1] - edges[full_bins]))
+    keys, durations = np.concatenate(keys), np.concatenate(durations)
+    order = np.argsort(keys, kind='mergesort')
+    keys, durations = keys[order], durations[order]
+    starts = np.flatnonzero(np.diff(keys, prepend=-1))
+    keys, durations = keys[starts], np.add.reduceat(durations, starts) if len(starts) else durations
+    positions = np.flatnonzero(durations)
+    keys, durations = keys[positions], durations[positions]
+    retval = df[list(state_columns)].iloc[rows[keys % n_groups]].reset_index(drop=True)
+    retval.insert(0, 'ts', _from_asi8(edges[keys // n_groups], dtype))
+    retval['duration'] = durations.view('m8[%s]' % np.datetime_data(dtype)[0])
+    return retval
+
+
+def _clean_overlap_values(begs, ends):
+    '''
+    Returns the int64 ends clipped to the next beg, the last end is kept.
+    '''
+    if not len(ends):
+        return ends.copy()
+    return np.minimum(ends, np.append(begs[1:], ends[-1]))
+
+
 def clean_overlap_timespan(begs, ends):
-    return pd.DataFrame({'ts_end': ends, 'ts_end_shifted': begs.shift(-1)}).min(axis=1)
+    dtype = np.asarray(ends.values).dtype
+    return pd.Series(_from_asi8(_clean_overlap_values(_asi8(begs.values), _asi8(ends.values)), dtype), index=ends.index)
 
 
 def fill_na_series(series):
@@ -76,6 +570,31 @@ def fill_na_dataframe(df):
             fill_na_series(df[column])
 
 
+def _contiguous_stamps(df, state_columns, value_columns, beg_col, end_col):
+    '''
+    Fast path of to_stamps for sorted contiguous spans whose values match at each
+    transition: the stamps are the begs followed by the last end. Returns None if df does
+    not meet these conditions.
+    '''
+    begs, ends = _asi8(df[beg_col].values), _asi8(df[end_col].values)
+    if not len(begs) or not (begs[1:] > begs[:-1]).all() or not (begs[1:] == ends[:-1]).all() or not ends[-1] > begs[-1]:
+        return None
+    for col in value_columns:
+        previous_ends, next_begs = df['end_%s' % col].values[:-1], df['beg_%s' % col].values[1:]
+        if not ((previous_ends == next_begs) | (pd.isnull(previous_ends) & pd.isnull(next_begs))).all():
+            return None
+    n = len(df)
+    retval = pd.DataFrame({'ts': pd.concat([df[beg_col], df[end_col].iloc[-1:]], ignore_index=True)})
+    for col in state_columns:
+        # reindexing introduces missing values with the same dtype promotion as the outer merge
+        retval['beg_%s' % col] = df[col].reset_index(drop=True).reindex(range(n + 1))
+    for col in value_columns:
+        retval[col] = pd.concat([df['beg_%s' % col], df['end_%s' % col].iloc[-1:]], ignore_index=True)
+    for col in state_columns:
+        retval['end_%s' % col] = pd.Series(df[col].values, index=range(1, n + 1)).reindex(range(n + 1))
+    return retval
+
+
 def to_stamps(df, state_columns, value_columns, beg_col='ts_beg', end_col='ts_end'):
     '''
         Convert an frame representing periods (eg each row has a beg and end) to a frame representing change of periods.
@@ -94,6 +613,10 @@ def to_stamps(df, state_columns, value_columns, beg_col='ts_beg', end_col='ts_en
         1 2015-01-02          2          1
         2 2015-01-03        NaN          2
     '''
+    retval = _contiguous_stamps(df, state_columns, value_columns, beg_col, end_col)
+    if retval is not None:
+        fill_na_dataframe(retval)
+        return retval
     beg_columns = dict(
         [(beg_col, 'ts')] +
         [(col, 'beg_%s' % col) for col in state_columns] +
@@ -140,114 +663,247 @@ def to_spans(df, state_columns, value_columns, beg_col='ts_beg', end_col='ts_end
         0  2015-01-01 2015-01-02      1
         1  2015-01-02 2015-01-03      2
     '''
-    beg_columns = dict(
-        [('ts', beg_col)] +
-        [('beg_%s' % col, col) for col in state_columns] +
-        [(col, 'beg_%s' % col) for col in value_columns]
-    )
-    end_columns = dict(
-        [('ts', end_col)] +
-        [('end_%s' % col, col) for col in state_columns] +
-        [(col, 'end_%s' % col) for col in value_columns]
-    )
-    df_beg = pd.DataFrame(df.iloc[:-1], columns=beg_columns.keys())
-    df_beg.rename(columns=beg_columns, inplace=True)
-    df_beg.reset_index(drop=True, inplace=True)
-    df_end = pd.DataFrame(df.iloc[1:], columns=end_columns.keys())
-    df_end.rename(columns=end_columns, inplace=True)
-    df_end.reset_index(drop=True, inplace=True)
-    # print(df_beg)
-    # print(df_end)
-    return pd.DataFrame(dict(list(df_beg.to_dict('series').items()) + list(df_end.to_dict('series').items())))
-
-
-# def merge_spans(left, right):
-    
-    # for key in ('beg', 'end'):
-    #     spans['ts'] = spans['ts_%s' % key]
-    #     spans = pd.merge(stamps, spans, how='outer', on='ts')
-    #     spans.set_index('ts', inplace=True)
-    #     spans.sort_index(inplace=True)
-    #     for column in columns_states:
-    #         spans['%s_%s' % (column, key)] = spans.pop(column).interpolate(method='time')
-    #         spans['%s_%s' % (column, key)].fillna(method='ffill', inplace=True)
-    #         spans['%s_%s' % (column, key)].fillna(method='bfill', inplace=True)
-    #     spans.reset_index(inplace=True)
-    #     spans.pop('ts')
-    #     spans = spans[~pd.isnull(spans['ts_%s' % key])]
-    # return spans
+    # Each span goes from one stamp to the next one
+    columns = [(beg_col, df['ts'].values[:-1])]
+    columns += [(col, df['end_%s' % col].values[1:]) for col in state_columns]
+    columns += [('beg_%s' % col, df[col].values[:-1]) for col in value_columns]
+    columns += [(end_col, df['ts'].values[1:])]
+    columns += [('end_%s' % col, df[col].values[1:]) for col in value_columns]
+    return pd.DataFrame(dict(columns), columns=[column for column, _ in columns])
 
 
-def compute_segments(df, columns):
+def merge_spans(stamps, spans, columns, ts_col='ts', beg_col='ts_beg', end_col='ts_end'):
+    '''
+    Returns spans with the values of the columns of stamps (a frame sorted by ts_col)
+    interpolated in time at the beginning and end of each span, in columns named
+    <column>_beg and <column>_end. Missing values of stamps are ignored and spans outside
+    of stamps get the first or last value.
+    '''
+    ts = _asi8(stamps[ts_col].values)
+    origin = ts[0] if len(ts) else 0
+    # interpolate on offsets to keep the precision of int64 nanoseconds in float64
+    ts = (ts - origin).astype('f8')
+    retval = spans.copy()
+    for key, col in (('beg', beg_col), ('end', end_col)):
+        x = (_asi8(spans[col].values) - origin).astype('f8')
+        for column in columns:
+            values = stamps[column].values.astype('f8')
+            valid = ~np.isnan(values)
+            retval['%s_%s' % (column, key)] = np.interp(x, ts[valid], values[valid]) if valid.any() else np.nan
+    return retval
+
+
+def merge_stamps(stamps, spans, state_columns, ts_col='ts', beg_col='ts_beg', end_col='ts_end'):
     '''
+    Returns stamps with the state_columns of the span containing each stamp, or missing
+    values for stamps outside of spans. Spans must not overlap.
     '''
-    mask = pd.Series([False] * len(df))
+    positions = SpanIndex(spans[beg_col], spans[end_col]).lookup(stamps[ts_col].values)
+    retval = stamps.copy()
+    for column in state_columns:
+        # -1 is not a label of the reset index, hence missing
+        retval[column] = spans[column].reset_index(drop=True).reindex(positions).values
+    return retval
+
+
+def _segment_starts(df, columns):
+    '''
+    Returns a boolean mask flagging the rows of df where the values of columns change,
+    missing values being equal to each other.
+    '''
+    starts = np.zeros(len(df), dtype=bool)
+    if len(df):
+        starts[0] = True
     for column in columns:
-        mask = mask | (df[column] != df[column].shift(1))
-    return mask.astype(int).cumsum()
+        values = np.asarray(df[column].values)
+        if values.dtype.kind in 'biumM':
+            values = _asi8(values)
+            starts[1:] |= values[1:] != values[:-1]
+        elif values.dtype.kind == 'f':
+            missing = np.isnan(values)
+            starts[1:] |= (values[1:] != values[:-1]) & ~(missing[1:] & missing[:-1])
+        else:
+            codes = pd.factorize(df[column])[0]
+            starts[1:] |= codes[1:] != codes[:-1]
+    return starts
+
+
+def compute_segments(df, columns):
+    '''
+    Returns the segment of each row of df, numbered from 1: a new segment starts whenever
+    the values of columns change.
+    '''
+    return pd.Series(np.cumsum(_segment_starts(df, columns)), index=df.index)
+
 
+def compute_segment_table(df, columns, ts_col='ts', beg_col='ts_beg', end_col='ts_end'):
+    '''
+    Run-length encodes the values of columns in df (see compute_segments) and returns a
+    frame with a row per segment: the positions i_beg and i_end of its first and last rows,
+    the spans beg_col and end_col going from the ts of its first row to the ts of the first
+    row of the next segment (the last ts for the last segment) and the values of columns.
+    '''
+    i_begs = np.flatnonzero(_segment_starts(df, columns))
+    i_ends = np.append(i_begs[1:], len(df))[:len(i_begs)] - 1
+    ts = df[ts_col].values
+    data = [
+        ('i_beg', i_begs),
+        ('i_end', i_ends),
+        (beg_col, ts[i_begs]),
+        (end_col, ts[np.minimum(i_ends + 1, len(df) - 1)]),
+    ]
+    data += [(column, df[column].values[i_begs]) for column in columns]
+    return pd.DataFrame(dict(data), columns=[column for column, _ in data])
 
-def merge_overlapping_events(df, beg, end, kind=None):
+
+def merge_overlapping_events(df, beg, end, kind=None, n_jobs=1):
     '''
     Args:
     - df (pandas dataframe): contains events.
     - beg (str): name of the column containing beginning timestamps.
     - end (str): name of the column containing ending timestamps.
-    - kind (str): name of the column describing the kind of events (useful if two kind of events coexist and you do not want to merge events
-    of different kinds).
+    - kind (str or list of str): name of the column(s) describing the kind of events (useful if two kind of events coexist and you do not want to merge events
+    of different kinds). Events whose kind is null are dropped.
+    - n_jobs (int): number of processes the kinds are split between (-1 for one per CPU).
     Output:
-    - ddf (pandas dataframe). Dataframe df where overlapping events have been merged
+    - ddf (pandas dataframe). Dataframe df where overlapping events have been merged, sorted by kind then beg
     '''
-    if kind is None:
-        ddf = df.sort_values(by=beg).reset_index(drop=True)
-        begs = ddf[beg].copy()
-        ends = ddf[end].copy()
-        i=0
-        while i <= len(begs)-2:
-            j=i+1
-            while ends[i]>begs[j]: # one enters the loop iff there is an overlap
-                begs[j]=begs[i] # event j actually starts at begs[i]
-                ends[i]=max(ends[i],ends[j]) # event i actually ends at least at ends[j]
-                if j<len(begs)-1:
-                     j+=1
-                else:
-                    break
-            i=j
-        # At this point, event i :
-        #   - starts at the initial begs[i] which was the correct one
-        #   thanks to the initial sort_values 
-        #   - ends at ends[j] with j the latest overlapping event after i
-        # 
-        # We drop all events from i+1 to j
-        for l in [beg,end]:
-            ddf.pop(l)
-        ddf[beg]=begs
-        ddf[end]=ends
-        ddf = ddf.drop_duplicates(beg, keep='first').reset_index(drop=True)
-    else:
-        raise ValueError('Case kind is not None not coded yet')
+    kind = _kind_list(kind)
+    if kind and n_workers(n_jobs) > 1:
+        return apply_by_kind(df, kind, merge_overlapping_events, n_jobs, beg=beg, end=end, kind=kind)
+    ddf = df.dropna(subset=kind) if kind else df
+    ddf = ddf.sort_values(by=kind + [beg], kind='mergesort').reset_index(drop=True)
+    dtype = np.asarray(ddf[end].values).dtype
+    ends = _asi8(ddf[end].values)
+    kind_starts = _kind_starts(ddf, kind) if kind else None
+    firsts = np.flatnonzero(_merge_group_starts(_asi8(ddf[beg].values), ends, kind_starts))
+    if len(firsts):
+        ends = np.maximum.reduceat(ends, firsts)
+    # Each group keeps the columns of its first event and ends at the
+    # latest end of the events it absorbed.
+    ddf = ddf.iloc[firsts].reset_index(drop=True)
+    begs = ddf.pop(beg)
+    ddf.pop(end)
+    ddf[beg] = begs
+    ddf[end] = _from_asi8(ends, dtype)
     return ddf
 
 
-def merge_overlapping_events_kind(df, beg, end, kind=None):
+def merge_overlapping_events_kind(df, beg, end, kind=None, n_jobs=1):
     '''
     Args:
     - df (pandas dataframe): contains events.
     - beg (str): name of the column containing beginning timestamps.
     - end (str): name of the column containing ending timestamps.
     - kind (list of str): name of the column describing the kind of events (useful if two kind of events coexist and you do not want to merge events of different kinds).
+    - n_jobs (int): number of processes the kinds are split between (-1 for one per CPU).
     Output:
     - ddf (pandas dataframe). Dataframe df where overlapping events have been merged
     '''
-    new_df = pd.DataFrame({beg:[],end:[]})
-    for kind, ddf in df.groupby(kind):
-        dddf = merge_overlapping_events(ddf, beg, end)
-        new_df = new_df.append(dddf, verify_integrity=True, ignore_index=True) 
-    new_df = new_df.reset_index(drop=True)
-    return new_df
+    new_df = merge_overlapping_events(df, beg, end, kind, n_jobs)
+    return new_df[[beg, end] + [column for column in new_df.columns if column not in (beg, end)]]
 
 
-def add_time_between_events(df, beg, end, kind=None):
+def _timespan_set_operation(frames, predicate, beg_col, end_col, kind):
+    '''
+    Sweeps over the begs and ends of the spans of frames (sorted by kind then timestamp) and
+    returns the spans where predicate(*coverages) holds, coverages being boolean arrays
+    telling whether each frame covers the interval between consecutive timestamps.
+    '''
+    kind = _kind_list(kind)
+    dtype = np.asarray(frames[0][beg_col].values).dtype
+    begs = np.concatenate([_asi8(frame[beg_col].values) for frame in frames])
+    ends = np.concatenate([_asi8(frame[end_col].values) for frame in frames])
+    sides = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+    if kind:
+        keys = pd.concat([frame[kind] for frame in frames], ignore_index=True)
+        groups = keys.groupby(kind).ngroup().values
+    else:
+        groups = np.zeros(len(begs), dtype=np.int64)
+    valid = groups >= 0  # null kinds are dropped
+    rows = np.flatnonzero(valid)
+    ts = np.concatenate([begs[valid], ends[valid]])
+    deltas = np.concatenate([np.ones(len(rows), dtype=np.int64), -np.ones(len(rows), dtype=np.int64)])
+    rows, groups, sides = np.concatenate([rows, rows]), np.concatenate([groups[valid]] * 2), np.concatenate([sides[valid]] * 2)
+    # Stable sorts by timestamp then group: much faster than lexsort on (nearly) sorted spans
+    order = _argsort_codes(groups, np.argsort(ts, kind='mergesort'))
+    ts, groups, rows, sides, deltas = ts[order], groups[order], rows[order], sides[order], deltas[order]
+    # Each group's coverages go back to 0 at its last end, so they can be summed over all groups
+    coverages = [np.cumsum(np.where(sides == side, deltas, 0)) > 0 for side in range(len(frames))]
+    # Coverages between a timestamp and the next one are the ones after its last event
+    last = np.ones(len(ts), dtype=bool)
+    last[:-1] = (ts[1:] != ts[:-1]) | (groups[1:] != groups[:-1])
+    ts, groups, rows = ts[last], groups[last], rows[last]
+    selected = predicate(*[coverage[last] for coverage in coverages])
+    if len(selected):
+        selected[:-1] &= groups[1:] == groups[:-1]
+        selected[-1] = False
+    starts = selected & ~np.concatenate([[False], selected[:-1]])
+    stops = selected & ~np.concatenate([selected[1:], [False]])
+    retval = keys.iloc[rows[starts]].reset_index(drop=True) if kind else pd.DataFrame()
+    retval[beg_col] = _from_asi8(ts[starts], dtype)
+    retval[end_col] = _from_asi8(ts[np.flatnonzero(stops) + 1], dtype)
+    return retval
+
+
+def union_timespans(left, right, beg_col='ts_beg', end_col='ts_end', kind=None):
+    '''
+    Returns the spans covered by left or right (of the same kind if kind is given), where
+    overlapping or contiguous spans are merged.
+    '''
+    return _timespan_set_operation([left, right], np.logical_or, beg_col, end_col, kind)
+
+
+def intersect_timespans(left, right, beg_col='ts_beg', end_col='ts_end', kind=None):
+    '''
+    Returns the spans covered by both left and right (of the same kind if kind is given).
+    '''
+    return _timespan_set_operation([left, right], np.logical_and, beg_col, end_col, kind)
+
+
+def subtract_timespans(left, right, beg_col='ts_beg', end_col='ts_end', kind=None):
+    '''
+    Returns the spans covered by left but not by right (of the same kind if kind is given).
+    '''
+    return _timespan_set_operation([left, right], lambda covered, removed: covered & ~removed, beg_col, end_col, kind)
+
+
+def complement_timespans(df, beg=None, end=None, beg_col='ts_beg', end_col='ts_end', kind=None):
+    '''
+    Returns the spans between beg and end not covered by df (for each kind if kind is given).
+    beg and end default to the first beg and last end of df (of each kind).
+    '''
+    kind = _kind_list(kind)
+    if kind:
+        bounds = df.groupby(kind).agg({beg_col: 'min', end_col: 'max'}).reset_index()
+    else:
+        bounds = pd.DataFrame({beg_col: [df[beg_col].min()], end_col: [df[end_col].max()]})
+    if beg is not None:
+        bounds[beg_col] = beg
+    if end is not None:
+        bounds[end_col] = end
+    return subtract_timespans(bounds.dropna(subset=[beg_col, end_col]), df, beg_col, end_col, kind)
+
+
+def _sorted_events(df, beg, kind):
+    '''
+    Returns df sorted by kind then beg (or keeping the order of the rows of a kind if beg is
+    None, rows whose kind is null are dropped) and the boolean masks flagging the first and
+    last event of each kind.
+    '''
+    order = np.arange(len(df)) if beg is None else np.argsort(_asi8(df[beg].values), kind='mergesort')
+    codes = _kind_codes(df, _kind_list(kind))
+    order = order[codes[order] >= 0]
+    order = _argsort_codes(codes, order)
+    codes = codes[order]
+    firsts = np.ones(len(order), dtype=bool)
+    firsts[1:] = codes[1:] != codes[:-1]
+    lasts = np.ones(len(order), dtype=bool)
+    lasts[:-1] = firsts[1:]
+    return df.iloc[order].reset_index(drop=True), firsts, lasts
+
+
+def add_time_between_events(df, beg, end, kind=None, n_jobs=1):
     '''
     Args:
     - df (pandas dataframe): contains events.
@@ -255,31 +911,204 @@ def add_time_between_events(df, beg, end, kind=None):
     - end (str) : name of the column containing ending timestamps.
     - kind (list of str): list of the columns defining a kind of event (if you want to study separately 
     different kinds of events)
+    - n_jobs (int): number of processes the kinds are split between (-1 for one per CPU).
+    Output:
+    - df sorted by kind then beg with the columns time_since_previous (beg minus the end of the
+    previous event of the same kind) and time_to_next (beg of the next event of the same kind
+    minus end), null for the first and last event of each kind.
     '''
-    new_df = pd.DataFrame({beg:[],end:[]})
-    for kind, ddf in df.groupby(kind):
-        dddf=ddf.sort_values(by=beg).reset_index(drop=True).copy()
-
-        begs = dddf[beg].values
-        ends = dddf[end].values
-        
-        if (len(begs)>1):
-            time_since_previous = [None]
-            for i in range(1,len(begs)):
-                time_since_previous.append(begs[i]-ends[i-1])
-    
-            time_to_next = []
-            for i in range(0,len(begs)-1):
-                time_to_next.append(begs[i+1]-ends[i])
-            time_to_next.append(None)
-
-            dddf['time_since_previous']=pd.Series(time_since_previous)
-            dddf['time_to_next']=pd.Series(time_to_next)
-        else:
-            dddf['time_since_previous']=pd.Series([None])
-            dddf['time_to_next']=pd.Series([None])
-        
-        new_df = new_df.append(dddf, verify_integrity=True, ignore_index=True)
-        dddf=None
-    return new_df
+    if _kind_list(kind) and n_workers(n_jobs) > 1:
+        return apply_by_kind(df, _kind_list(kind), add_time_between_events, n_jobs, beg=beg, end=end, kind=kind)
+    ddf, firsts, lasts = _sorted_events(df, beg, kind)
+    begs, ends = ddf[beg], ddf[end]
+    ddf['time_since_previous'] = (begs - ends.shift(1)).mask(firsts)
+    ddf['time_to_next'] = (begs.shift(-1) - ends).mask(lasts)
+    return ddf
+
+
+def time_between_events_stats(df, beg, end, kind=None, threshold=None):
+    '''
+    Returns, for each kind, the number of events and the min, median and max of the time
+    between consecutive events (see add_time_between_events), and if threshold is given the
+    number of times between events greater than threshold.
+    '''
+    kind = _kind_list(kind)
+    ddf, firsts, lasts = _sorted_events(df, beg, kind)
+    gaps = ddf[beg] - ddf[end].shift(1)
+    dtype = gaps.dtype
+    # Statistics are computed on floats so that missing gaps are NaN whatever the dtype
+    gaps = pd.Series(np.where(firsts, np.nan, _asi8(gaps.values)), dtype='d')
+    groups = gaps.groupby(np.cumsum(firsts))
+    retval = ddf.loc[firsts, kind].reset_index(drop=True)
+    retval['count'] = groups.size().values
+    for name, stat in (('min', groups.min), ('median', groups.median), ('max', groups.max)):
+        values = stat().values
+        if dtype.kind == 'm':
+            values = pd.to_timedelta(values)
+        retval[name] = values
+    if threshold is not None:
+        threshold = _asi8(pd.to_timedelta(threshold).to_timedelta64()) if dtype.kind == 'm' else threshold
+        retval['above_threshold'] = (gaps > threshold).groupby(np.cumsum(firsts)).sum().values
+    return retval
+
+
+class SpanIndex(object):
+    '''
+    Index on spans answering, for many timestamps or windows at once, which spans contain
+    them or overlap them. Spans are half-open [beg, end). Positions returned refer to the
+    rows of the begs and ends given at construction.
+
+    The spans are sorted once by beg. The timestamps contained in a span form a range of the
+    sorted timestamps, and the spans beginning in a window a range of the sorted spans, so
+    that every query is a couple of searchsorted whatever the overlap between spans.
+    '''
+
+    def __init__(self, begs, ends):
+        if len(begs) != len(ends):
+            raise BadLengthsError
+        begs, ends = _asi8(begs), _asi8(ends)
+        self.order = np.argsort(begs, kind='mergesort')
+        self.begs, self.ends = begs[self.order], ends[self.order]
+        self.overlapping = bool(len(begs) > 1 and (np.maximum.accumulate(self.ends)[:-1] > self.begs[1:]).any())
+
+    def _pairs(self, queries, spans):
+        '''
+        Returns the (query, span) pairs sorted by query then span position.
+        '''
+        spans = self.order[spans]
+        order = np.lexsort((spans, queries))
+        return queries[order], spans[order]
+
+    def _stab(self, ts):
+        '''
+        Returns the (query, sorted span) pairs of the spans containing the timestamps ts.
+        '''
+        sort = None if (ts[1:] >= ts[:-1]).all() else np.argsort(ts, kind='mergesort')
+        sorted_ts = ts if sort is None else ts[sort]
+        spans, queries = _expand_ranges(
+            np.searchsorted(sorted_ts, self.begs, side='left'),
+            np.searchsorted(sorted_ts, self.ends, side='left')
+        )
+        return queries if sort is None else sort[queries], spans
+
+    def stab(self, ts):
+        '''
+        Returns the (query, span) position arrays of each span containing each of the
+        timestamps ts.
+        '''
+        return self._pairs(*self._stab(_asi8(ts)))
+
+    def lookup(self, ts):
+        '''
+        Returns, for each of the timestamps ts, the position of the span containing it or
+        -1. Raises OverlapError on overlapping spans.
+        '''
+        if self.overlapping:
+            raise OverlapError
+        ts = _asi8(ts)
+        spans = np.searchsorted(self.begs, ts, side='right') - 1
+        found = spans >= 0
+        found[found] = self.ends[spans[found]] > ts[found]
+        retval = np.full(len(ts), -1, dtype=np.int64)
+        retval[found] = self.order[spans[found]]
+        return retval
+
+    def window(self, begs, ends):
+        '''
+        Returns the (query, span) position arrays of each span overlapping each of the
+        windows [begs, ends).
+        '''
+        begs, ends = _asi8(begs), _asi8(ends)
+        # Spans containing the beginning of the window...
+        queries, spans = self._stab(begs)
+        keep = self.begs[spans] < ends[queries]
+        # ... and spans beginning inside the window
+        others, other_spans = _expand_ranges(
+            np.searchsorted(self.begs, begs, side='right'),
+            np.searchsorted(self.begs, ends, side='left')
+        )
+        return self._pairs(np.concatenate([queries[keep], others]), np.concatenate([spans[keep], other_spans]))
+
+
+class Timespans(object):
+    '''
+    Compact container of timespans: int64 begs and ends (nanoseconds since epoch for
+    datetimes) and optional states stored as categorical codes. Columns of a frame are
+    viewed rather than copied where possible, and the methods work on the arrays directly.
+    '''
+    __slots__ = ('begs', 'ends', 'codes', 'categories', 'dtype')
+
+    def __init__(self, begs, ends, codes=None, categories=None, dtype=None):
+        if len(begs) != len(ends) or (codes is not None and len(codes) != len(begs)):
+            raise BadLengthsError
+        self.dtype = np.asarray(begs).dtype if dtype is None else np.dtype(dtype)
+        self.begs, self.ends = _asi8(begs), _asi8(ends)
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def from_frame(cls, df, beg_col='ts_beg', end_col='ts_end', state_col=None):
+        if getattr(df[beg_col].dtype, 'tz', None) or getattr(df[end_col].dtype, 'tz', None):
+            raise HasTimezoneError
+        codes = categories = None
+        if state_col is not None:
+            states = df[state_col]
+            states = states.values if states.dtype.name == 'category' else pd.Categorical(states)
+            codes, categories = states.codes, states.categories
+        return cls(df[beg_col].values, df[end_col].values, codes, categories)
+
+    def to_frame(self, beg_col='ts_beg', end_col='ts_end', state_col='state'):
+        data = [(beg_col, _from_asi8(self.begs, self.dtype)), (end_col, _from_asi8(self.ends, self.dtype))]
+        if self.codes is not None:
+            data.append((state_col, pd.Categorical.from_codes(self.codes, self.categories)))
+        return pd.DataFrame(dict(data), columns=[column for column, _ in data], copy=False)
+
+    def __len__(self):
+        return len(self.begs)
+
+    def take(self, positions):
+        return Timespans(
+            self.begs[positions], self.ends[positions],
+            None if self.codes is None else self.codes[positions], self.categories, self.dtype
+        )
+
+    def audit(self):
+        violations = _audit_timespan_values(self.begs, self.ends, stop_at_first=True)
+        if violations:
+            raise violations[0][0]
+
+    def describe(self):
+        if not len(self):
+            print('Empty series')
+            return
+        duration = pd.Timedelta(int((self.ends - self.begs).sum()))
+        contiguous_transitions = int((self.begs[1:] == self.ends[:-1]).sum())
+        return _describe_timespan(
+            pd.Timestamp(self.begs[0]), pd.Timestamp(self.ends[-1]), len(self), contiguous_transitions, duration
+        )
+
+    def clean_overlap(self):
+        '''
+        Returns the timespans whose ends are clipped to the next beg, see clean_overlap_timespan.
+        '''
+        return Timespans(self.begs, _clean_overlap_values(self.begs, self.ends), self.codes, self.categories, self.dtype)
 
+    def merge_overlapping(self, by_state=False):
+        '''
+        Returns the timespans where overlapping ones have been merged (only within a state if
+        by_state), sorted by state then beg, see merge_overlapping_events.
+        '''
+        order = np.argsort(self.begs, kind='mergesort')
+        kind_starts = None
+        if by_state and self.codes is not None:
+            order = order[self.codes[order] >= 0]
+            order = _argsort_codes(np.maximum(self.codes, 0).astype(np.int64), order)
+            codes = self.codes[order]
+            kind_starts = np.ones(len(order), dtype=bool)
+            kind_starts[1:] = codes[1:] != codes[:-1]
+        spans = self.take(order)
+        firsts = np.flatnonzero(_merge_group_starts(spans.begs, spans.ends, kind_starts))
+        merged = spans.take(firsts)
+        if len(firsts):
+            merged.ends = np.maximum.reduceat(spans.ends, firsts)
+        return merged
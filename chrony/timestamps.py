@@ -2,57 +2,251 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
 
+from .core import as_datetime_index, _expand_ranges, _runs
+from .parallel import n_workers
 from .exceptions import BadLengthsError, MissingDataError, NotSortedError, IntegrityError, HasTimezoneError, TimeStepError
 
-def audit(df, talk_to_me=False):
-    if df.empty:
-        return
-    if df.index.tz:
-        if talk_to_me:
-            print('HasTimezoneError')
-        else:
-            raise HasTimezoneError
-    ts = pd.Series(df.index.copy())
-    if len((ts-ts.shift())[1:].drop_duplicates())>1:
-        if talk_to_me:
-            print('TimeStepError')
-        else:
-            raise TimeStepError
-    if (ts < ts.shift()).sum():
-        if talk_to_me:
-            print('NotSortedError')
-        else:
-            raise NotSortedError
-    if df.count().values[0]==0:
+
+def _audit_errors(df, uneven, unsorted, no_data, check_time_step=True):
+    """
+    Returns the errors found by audit, given whether the time steps of df
+    are uneven or negative and whether df has no data.
+    """
+    return [error for error, found in [
+        (HasTimezoneError, bool(df.index.tz)),
+        (TimeStepError, check_time_step and uneven),
+        (NotSortedError, unsorted),
+        (MissingDataError, no_data),
+    ] if found]
+
+
+def _report(errors, talk_to_me=False):
+    """
+    Raises the first of errors or, if talk_to_me, prints all of them.
+    """
+    for error in errors:
         if talk_to_me:
-            print('MissingDataError')
+            print(error.__name__)
         else:
-            raise MissingDataError
+            raise error
+
+
+def audit(df, talk_to_me=False, check_time_step=True):
+    if df.empty:
+        return
+    steps = np.diff(as_datetime_index(df.index).asi8)
+    _report(_audit_errors(df, (steps != steps[:1]).any(), (steps < 0).any(), df.count().values[0] == 0, check_time_step), talk_to_me)
+
+
+class TimestampValidator(object):
+    """
+    Validates a stream of timestamps sample by sample (or by micro-batch)
+    against the previous one only, making the timezone, time step and sort
+    verifications of audit in O(1) per sample. The time step is given or
+    taken from the first two samples. Errors are raised, or collected in
+    errors as (row, exception) couples if raise_errors is False.
+    """
+
+    def __init__(self, time_step=None, raise_errors=True):
+        self.time_step = None if time_step is None else pd.Timedelta(time_step).value
+        self.raise_errors = raise_errors
+        self.errors = []
+        self.count = 0
+        self.last = None
+
+    def check(self, ts):
+        """
+        Validates one timestamp or a batch of timestamps.
+        """
+        ts = as_datetime_index(ts)
+        errors = []
+        if ts.tz:
+            errors.append((self.count, HasTimezoneError('Batch at row %s' % self.count)))
+        t = ts.asi8 if self.last is None else np.concatenate([[self.last], ts.asi8])
+        offset = self.count - len(t) + len(ts)
+        steps = np.diff(t)
+        if self.time_step is None and len(steps):
+            self.time_step = steps[0]
+        for row in np.flatnonzero(steps != self.time_step):
+            error = NotSortedError if steps[row] < 0 else TimeStepError
+            errors.append((offset + row + 1, error('At row %s' % (offset + row + 1))))
+        if errors:
+            errors.sort(key=lambda error: error[0])
+            if self.raise_errors:
+                raise errors[0][1]
+            self.errors.extend(errors)
+        if len(ts):
+            self.count += len(ts)
+            self.last = t[-1]
+
+
+class Holes(namedtuple('Holes', ['i_beg', 'i_end', 'length'])):
+    """
+    Array-backed holes of a time series: i_beg and i_end are the positions of
+    the first and last missing values of each hole, length its number of values.
+    """
+    __slots__ = ()
+
+    def __len__(self):
+        """
+        Returns the number of holes (not the number of fields).
+        """
+        return len(self.length)
+
+    def to_frame(self, index):
+        """
+        Returns the holes as the DataFrame of find_holes given the index of
+        the time series.
+        """
+        ts = np.asarray(index)
+        return pd.DataFrame({
+            'ts_beg': ts[self.i_beg],
+            'ts_end': ts[self.i_end],
+            'length': self.length,
+            'i_beg': self.i_beg,
+            'i_end': self.i_end
+        }, columns=['ts_beg', 'ts_end', 'length', 'i_beg', 'i_end'])
+
+
+def _chunk_bounds(n, n_chunks):
+    """
+    Returns the bounds of n_chunks ranges of positions of about the same
+    length covering range(n).
+    """
+    return np.unique(np.linspace(0, n, n_chunks + 1).astype(np.int64))
+
+
+# Arrays shared with the worker processes of _map_chunks
+_shared = ()
+
+
+def _share(*arrays):
+    global _shared
+    _shared = arrays
+
+
+def _call_shared(func, args):
+    return func(*(_shared + tuple(args)))
+
+
+def _map_chunks(func, arrays, args, n_jobs):
+    """
+    Returns [func(*(arrays + a)) for a in args], computed in n_jobs
+    processes. The arrays are handed to each process once when it starts
+    (without copy where processes are forked), only the arguments a of
+    each chunk being sent with it.
+    """
+    arrays = tuple(arrays)
+    if n_workers(n_jobs) == 1 or len(args) < 2:
+        return [func(*(arrays + tuple(a))) for a in args]
+    with ProcessPoolExecutor(n_workers(n_jobs), initializer=_share, initargs=arrays) as executor:
+        return list(executor.map(partial(_call_shared, func), args))
+
+
+def _chunk_steps(ts, lo, hi, step):
+    """
+    Returns whether the time steps between the int64 timestamps ts[lo] to
+    ts[hi] differ from step and whether some of them are negative.
+    """
+    steps = np.diff(ts[lo:hi + 1])
+    return bool((steps != step).any()), bool((steps < 0).any())
+
+
+def _chunk_holes(val, ts, lo, hi, step):
+    """
+    Returns the positions of the first and last missing values of the holes
+    of val[lo:hi] and the _chunk_steps of ts from lo to hi.
+    """
+    missing = np.concatenate(([False], pd.isnull(val[lo:hi]), [False]))
+    edges = np.diff(missing.view(np.int8))
+    return (np.flatnonzero(edges == 1) + lo, np.flatnonzero(edges == -1) - 1 + lo) + _chunk_steps(ts, lo, hi, step)
+
+
+def _first_step(ts, i, j):
+    return ts[i + 1] - ts[i] if j - i > 1 else 0
+
+
+def _find_hole_indices(df, n_jobs=1):
+    """
+    Returns the Holes of df and whether its time steps are uneven or
+    negative, the chunks of df being processed in n_jobs processes.
+    """
+    val, ts = df.values.ravel(), as_datetime_index(df.index).asi8
+    bounds = _chunk_bounds(len(val), n_workers(n_jobs))
+    step = _first_step(ts, 0, len(ts))
+    chunks = _map_chunks(_chunk_holes, (val, ts), [(i, j, step) for i, j in zip(bounds[:-1], bounds[1:])], n_jobs)
+    i_beg = np.concatenate([c[0] for c in chunks] + [np.array([], dtype=np.int64)])
+    i_end = np.concatenate([c[1] for c in chunks] + [np.array([], dtype=np.int64)])
+    # Holes of a chunk are separated by values, so that consecutive holes only
+    # touch when they are the two halves of a hole crossing a chunk bound
+    stitched = np.flatnonzero(i_beg[1:] == i_end[:-1] + 1)
+    i_beg, i_end = np.delete(i_beg, stitched + 1), np.delete(i_end, stitched)
+    uneven = any(c[2] for c in chunks)
+    unsorted = any(c[3] for c in chunks)
+    return Holes(i_beg, i_end, i_end - i_beg + 1), uneven, unsorted
+
+
+def _audited_holes(df, n_jobs=1, check_time_step=True):
+    """
+    Returns the Holes of df after making the verifications of audit, both
+    on the chunks of df in n_jobs processes.
+    """
+    holes, uneven, unsorted = _find_hole_indices(df, n_jobs)
+    if not df.empty:
+        no_data = len(holes) == 1 and holes.length[0] == len(df)
+        _report(_audit_errors(df, uneven, unsorted, no_data, check_time_step))
+    return holes
+
+
+def _audit_range(df, i, j, n_jobs=1):
+    """
+    Makes the verifications of audit on df[i:j], its time steps being
+    checked by chunks in n_jobs processes.
+    """
+    if j <= i:
+        return
+    ts = as_datetime_index(df.index).asi8
+    bounds = i + _chunk_bounds(j - 1 - i, n_workers(n_jobs))
+    step = _first_step(ts, i, j)
+    chunks = _map_chunks(_chunk_steps, (ts,), [(lo, hi, step) for lo, hi in zip(bounds[:-1], bounds[1:])], n_jobs)
+    _report(_audit_errors(df, any(c[0] for c in chunks), any(c[1] for c in chunks), False))
 
-def find_holes(df):
+
+def find_hole_indices(df, n_jobs=1):
+    """
+    df (pandas Time Series)
+    Returns the Holes of df, found by run-length encoding its missing values.
+    With n_jobs>1, df is split into chunks audited and encoded in parallel,
+    and the holes crossing their bounds are stitched, with the same result.
+    """
+    return _audited_holes(df, n_jobs)
+
+
+def find_holes(df, n_jobs=1):
     """
     df (pandas Time Series) 
     """
-    audit(df)
-    t, d = df.index, df.values
-    n = len(t)
-    holes = []
-    i=0
-    while i<n:
-        l=0
-        dd = d[i]
-        while np.isnan(dd) and i+l<n-1:
-            l+=1
-            dd = d[i+l]
-        if l>0: # there is a hole
-            holes.append({'ts_beg':t[i],'ts_end':t[i+l-1],'length':l,'i_beg':i,'i_end':i+l-1})
-            i+=l
-        else:
-            i+=1
-    return pd.DataFrame(holes)
+    return find_hole_indices(df, n_jobs).to_frame(df.index)
+
+
+def _trim_bounds(df):
+    """
+    Returns the positions i, j such that df[i:j] is df without the missing
+    data at its beginning and end.
+    """
+    valid = np.flatnonzero(~pd.isnull(df.values.ravel()))
+    if len(valid) == 0:
+        return 0, 0
+    return valid[0], valid[-1] + 1
+
 
 def trim(df):
     """
@@ -61,42 +255,46 @@ def trim(df):
     data at the beginning and end of the series have been 
     trimmed out.
     """
-    i=0
-    val = df.values.squeeze()
-    ts = df.index.values.squeeze()
-    while np.isnan(val[i]):
-        i+=1
-    j=len(val)-1
-    while np.isnan(val[j]):
-        j-=1
-    return pd.DataFrame({'data':val[i:j+1]}, index=ts[i:j+1])
+    i, j = _trim_bounds(df)
+    val = df.values.ravel()
+    ts = df.index.values
+    return pd.DataFrame({'data': val[i:j]}, index=ts[i:j])
 
 
-def cut(df, min_hole_duration):
+def _cut_slices(df, min_hole_duration, n_jobs=1):
+    """
+    Yields the slices of df given by cut.
+    """
+    holes = _find_hole_indices(df, n_jobs)[0]
+    n = len(df)
+    i_beg, i_end = holes.i_beg, holes.i_end
+    if len(i_beg) and i_beg[0] == 0 and i_end[0] == n - 1:
+        i, j = 0, 0
+    else:
+        # holes at the beginning and end of df are trimmed out
+        i = i_end[0] + 1 if len(i_beg) and i_beg[0] == 0 else 0
+        j = i_beg[-1] if len(i_beg) and i_end[-1] == n - 1 else n
+    _audit_range(df, i, j, n_jobs)
+    inner = (i_beg >= i) & (i_end < j)
+    cuts = inner & (holes.length > min_hole_duration)
+    i_begs = np.concatenate(([i], i_end[cuts] + 1))
+    i_ends = np.concatenate((i_beg[cuts], [j]))
+    for i_beg, i_end in zip(i_begs, i_ends):
+        yield slice(i_beg, i_end)
+
+
+def cut(df, min_hole_duration, lazy=False, n_jobs=1):
     """
     Cuts the time series df in h+1 time series where h is the
     number of holes in df with duration > min_hole_duration.
+    If lazy is True, returns a generator of the slices of df
+    corresponding to each time series instead.
+    With n_jobs>1, the holes are found in parallel (see find_hole_indices).
     """
-    df = trim(df)
-    holes = find_holes(df)
-    holes = holes[holes.length>min_hole_duration]
-    beg, end = holes.i_beg, holes.i_end
-    t, d, n = df.index.values.squeeze(), df.values.squeeze(), len(holes)
-    # add first cut
-    i_beg = 0
-    i_end = beg[0]
-    time_series = [pd.DataFrame({'data':d[i_beg:i_end]},index=t[i_beg:i_end])] 
-    # add all intermediate cuts
-    for j in range(n-1):
-        i_beg = end[j]+1
-        i_end = beg[j+1] 
-        time_series.append(pd.DataFrame({'data':d[i_beg:i_end]},index=t[i_beg:i_end])) 
-    # add last cut (if different from first)
-    if n>0:
-        i_beg=end[n-1]+1
-        i_end=len(d)
-        time_series.append(pd.DataFrame({'data':d[i_beg:i_end]},index=t[i_beg:i_end])) 
-    return time_series
+    if lazy:
+        return _cut_slices(df, min_hole_duration, n_jobs)
+    t, d = df.index.values, df.values.ravel()
+    return [pd.DataFrame({'data': d[s]}, index=t[s]) for s in _cut_slices(df, min_hole_duration, n_jobs)]
 
 
 def cut_ts_old(ts, val, min_hole_duration):
@@ -125,7 +323,7 @@ def describe(df):
     if df.empty:
         print('Empty series')
         return
-    holes = pd.DataFrame(find_holes(df))
+    holes = find_hole_indices(df)
     ts = df.index.values
     metrics = (
         ('beg',ts[0]),
@@ -133,14 +331,14 @@ def describe(df):
         ('end', ts[len(ts)-1]),
         ('# ts',len(ts)),
         ('missing values',len(ts)-df.count()),
-        ('# holes',len(holes))
+        ('# holes', len(holes))
     )
-    if len(holes)>0:
+    if len(holes) > 0:
         metrics+=(
-        ('min hole size', holes.length.min()),
-        ('median hole size', np.percentile(holes.length.values,50)),
-        ('max hole size', holes.length.max()),
-        ('[1%,10%,25%,75%,90%,99%] percentiles hole size', [np.percentile(holes.length.values,x) for x in [1,5,25,75,95,99]])
+            ('min hole size', holes.length.min()),
+            ('median hole size', np.percentile(holes.length, 50)),
+            ('max hole size', holes.length.max()),
+            ('[1%,10%,25%,75%,90%,99%] percentiles hole size', [np.percentile(holes.length, x) for x in [1, 5, 25, 75, 95, 99]])
         )
     retval = pd.Series([m[1] for m in metrics], index=[m[0] for m in metrics])
     print(retval)
@@ -158,48 +356,260 @@ def fill_ts(df, time_step):
     return df.merge(pd.DataFrame({'ts':ts}),on='ts',how='outer').sort_values(by='ts').reset_index(drop=True)
     
 
-def fill_data(df, max_hole_duration, method='interpolate'):
+FILL_METHODS = ('interpolate', 'time', 'previous', 'nearest')
+
+
+def _valid_neighbour(holes, p, step):
     """
-    Fill the holes of df that have a duration <= max_hole_duration
-    using linear interpolation.
+    Returns the position of the first valid value from position p on,
+    going backward (step=-1) or forward (step=1).
     """
-    holes = find_holes(df)
-    if len(holes)==0:
-        return df
+    k = np.searchsorted(holes.i_beg, p, side='right') - 1
+    if k >= 0 and holes.i_end[k] >= p:
+        return holes.i_beg[k] - 1 if step < 0 else holes.i_end[k] + 1
+    return p
+
+
+def _fill_chunk(val, ts, lo, hi, fill_begs, fill_ends, before, after, method):
+    """
+    Returns val[lo:hi] with the positions [fill_begs, fill_ends] filled, ts
+    being the int64 timestamps. before (resp. after) is (position, value,
+    timestamp) of the last valid value before (resp. the first one after)
+    the chunk, or None.
+    """
+    val, ts = val[lo:hi], ts[lo:hi]
+    bounds = np.zeros(len(val) + 1, dtype=np.int64)
+    np.add.at(bounds, fill_begs - lo, 1)
+    np.add.at(bounds, fill_ends - lo + 1, -1)
+    i = np.flatnonzero(np.cumsum(bounds[:-1]))
+    if len(i) == 0:
+        return val
+    valid = np.flatnonzero(~pd.isnull(val))
+    vval, vts = val[valid], ts[valid]
+    valid = valid + lo
+    if before is not None:
+        valid, vval, vts = np.r_[before[0], valid], np.r_[before[1], vval], np.r_[before[2], vts]
+    if after is not None:
+        valid, vval, vts = np.r_[valid, after[0]], np.r_[vval, after[1]], np.r_[vts, after[2]]
+    if len(valid) == 0:
+        raise ValueError('Empty Time Series!')
+    x = i + lo
+    j = np.searchsorted(valid, x)
+    j_beg = np.maximum(j - 1, 0)
+    j_end = np.minimum(j, len(valid) - 1)
+    if method == 'previous':
+        newval = vval[j_beg]
+    elif method == 'nearest':
+        newval = np.where(x - valid[j_beg] <= valid[j_end] - x, vval[j_beg], vval[j_end])
     else:
-        ts = df.index.values.squeeze() 
-        val = df.values.squeeze()
-        newval = val.copy()
-        for ind, h in holes.iterrows():
-            length, ts_beg, ts_end = h['length'],np.datetime64(h['ts_beg']),np.datetime64(h['ts_end'])
-            if length<=max_hole_duration:
-                i_beg = np.where(ts==ts_beg)[0][0]-1
-                i_end = np.where(ts==ts_end)[0][0]+1
-                if i_beg==-1 and i_end==len(val):
-                    raise ValueError('Empty Time Series!')
-                elif i_beg==-1:
-                    for i in range(0,i_end):
-                        newval[i] = val[i_end]
-                elif i_end==len(val):
-                    for i in range(i_beg+1,i_end):
-                        newval[i] = val[i_beg]
-                else:
-                    for i in range(i_beg+1,i_end):
-                        newval[i] = val[i_beg] + (i-i_beg)/(i_end-i_beg)*(val[i_end] - val[i_beg])
-        return pd.DataFrame({'data':newval},index=ts)
-
-def cut_fixed_size(df, size, overlap):
+        if method == 'interpolate':
+            x_beg, x_end = valid[j_beg], valid[j_end]
+        else:
+            x, x_beg, x_end = ts[i], vts[j_beg], vts[j_end]
+        with np.errstate(divide='ignore', invalid='ignore'):  # edges are overwritten below
+            newval = vval[j_beg] + (x - x_beg) / (x_end - x_beg) * (vval[j_end] - vval[j_beg])
+    # edges: backward fill before the first value, forward fill after the last one
+    newval = np.where(j == 0, vval[j_end], newval)
+    newval = np.where(j == len(valid), vval[j_beg], newval)
+    val = val.copy()
+    val[i] = newval
+    return val
+
+
+def fill_data(df, max_hole_duration, method='interpolate', n_jobs=1):
+    """
+    Fill the holes of df that have a duration <= max_hole_duration.
+    Holes at the beginning (resp. end) of df are filled with the first
+    (resp. last) value. Other holes are filled according to method:
+    - 'interpolate': linear interpolation on positions.
+    - 'time': linear interpolation on timestamps, the only method allowed
+      on a time series whose time step is not constant.
+    - 'previous': last value before the hole.
+    - 'nearest': closest value in position (previous one on ties).
+    With n_jobs>1, df is split into chunks filled in parallel, each one
+    knowing the valid values around it, with the same result.
+    """
+    if method not in FILL_METHODS:
+        raise ValueError('Unknown fill method %s' % method)
+    # interpolating on timestamps does not need a constant time step
+    holes = _audited_holes(df, n_jobs, check_time_step=method != 'time')
+    if len(holes) == 0:
+        return df
+    ts = as_datetime_index(df.index).asi8
+    val = df.values.ravel()
+    n = len(val)
+    fill = holes.length <= max_hole_duration
+    fill_begs, fill_ends = holes.i_beg[fill], holes.i_end[fill]
+    bounds = _chunk_bounds(n, n_workers(n_jobs))
+    args = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        # holes to fill overlapping the chunk, clipped to it
+        k = slice(np.searchsorted(fill_ends, lo), np.searchsorted(fill_begs, hi))
+        p, q = _valid_neighbour(holes, lo - 1, -1), _valid_neighbour(holes, hi, 1)
+        args.append((
+            lo, hi,
+            np.maximum(fill_begs[k], lo), np.minimum(fill_ends[k], hi - 1),
+            (p, val[p], ts[p]) if p >= 0 else None,
+            (q, val[q], ts[q]) if q < n else None,
+            method
+        ))
+    val = np.concatenate(_map_chunks(_fill_chunk, (val, ts), args, n_jobs))
+    return pd.DataFrame({'data': val}, index=df.index.values)
+
+
+def cut_fixed_size(df, size, overlap, as_array=False):
     """
     Takes in entry a time series with no hole and length > size.
     Returns n time series of length size which overlap is given by overlap.
+    If as_array is True, returns instead a read-only (n, size) view on the
+    values of df, without copy, and the timestamps at which each time series
+    begins.
     """
-    if len(find_holes(df))>0:
+    if len(find_hole_indices(df)) > 0:
         raise ValueError('The time series has holes and should not')
-    if len(df)<size:
-        return []
+    step = size - overlap
+    n = 1 + (len(df) - size) // step if len(df) >= size else 0
+    data = df.values.ravel()
+    ts = df.index.values
+    if as_array:
+        windows = as_strided(data, shape=(n, size), strides=(step * data.strides[0], data.strides[0]), writeable=False)
+        return windows, ts[:n * step:step]
+    return [pd.DataFrame({'data': data[i * step:i * step + size]}, index=ts[i * step:i * step + size]) for i in range(n)]
+
+
+def to_panel(df, id_col, ts_col='ts', value_col='data'):
+    """
+    Returns the wide frame (one column per series, indexed by the sorted
+    timestamps) of the long frame df with one row per series and timestamp.
+    Timestamps missing for a series become missing values.
+    """
+    return df.pivot(index=ts_col, columns=id_col, values=value_col).sort_index()
+
+
+def _panel_values(df, copy=False):
+    """
+    Returns the values of the wide frame df as a 2-D float array with one
+    contiguous row per series (a view on the pandas block if possible).
+    """
+    values = np.array(df.values, dtype='d', order='F', copy=copy)
+    return values.T
+
+
+def audit_panel(df):
+    """
+    Makes the verifications of audit on the wide frame df (one column per
+    series sharing the index): the timestamps are checked once and
+    MissingDataError is raised if a series has no data.
+    """
+    if df.empty:
+        return
+    if df.index.tz:
+        raise HasTimezoneError
+    steps = np.diff(as_datetime_index(df.index).asi8)
+    if len(steps) and (steps != steps[0]).any():
+        raise TimeStepError
+    if (steps < 0).any():
+        raise NotSortedError
+    empty = np.flatnonzero(df.isnull().values.all(axis=0))
+    if len(empty):
+        raise MissingDataError('Series %s' % df.columns[empty[0]])
+
+
+def find_holes_panel(df):
+    """
+    Returns the holes of every series of the wide frame df stacked in one
+    frame, sorted by series then position: the columns of find_holes and the
+    series of each hole.
+    """
+    rows, i_beg, i_end = _runs(np.isnan(_panel_values(df)))
+    ts = df.index.values
+    return pd.DataFrame({
+        'series': df.columns.values[rows],
+        'ts_beg': ts[i_beg],
+        'ts_end': ts[i_end - 1],
+        'length': i_end - i_beg,
+        'i_beg': i_beg,
+        'i_end': i_end - 1
+    }, columns=['series', 'ts_beg', 'ts_end', 'length', 'i_beg', 'i_end'])
+
+
+def trim_panel(df):
+    """
+    Returns the series of the wide frame df trimmed as by trim, stacked in a
+    long frame with columns series, ts and data. All-NaN series are dropped.
+    """
+    values = _panel_values(df)
+    m, n = values.shape
+    valid = ~np.isnan(values)
+    has_data = valid.any(axis=1)
+    i = np.where(has_data, np.argmax(valid, axis=1), 0)
+    j = np.where(has_data, n - np.argmax(valid[:, ::-1], axis=1), 0)
+    rows, positions = _expand_ranges(i, j)
+    return pd.DataFrame({
+        'series': df.columns.values[rows],
+        'ts': df.index.values[positions],
+        'data': values.reshape(-1)[rows * n + positions]
+    }, columns=['series', 'ts', 'data'])
+
+
+def fill_data_panel(df, max_hole_duration, method='interpolate'):
+    """
+    Fills the holes of every series of the wide frame df as fill_data does,
+    in one pass over all the holes. Raises ValueError if a series to fill
+    has no data.
+    """
+    if method not in FILL_METHODS:
+        raise ValueError('Unknown fill method %s' % method)
+    values = _panel_values(df, copy=True)
+    m, n = values.shape
+    rows, i_beg, i_end = _runs(np.isnan(values))
+    fill = i_end - i_beg <= max_hole_duration
+    rows, i_beg, i_end = rows[fill], i_beg[fill], i_end[fill]
+    empty = (i_beg == 0) & (i_end == n)
+    if empty.any():
+        raise ValueError('Empty Time Series! (series %s)' % df.columns[rows[empty][0]])
+    holes, i = _expand_ranges(i_beg, i_end)
+    # Previous and next valid positions, the same one at the edges
+    before, after = i_beg[holes] - 1, i_end[holes]
+    before, after = np.where(before < 0, after, before), np.where(after == n, before, after)
+    flat = values.reshape(-1)
+    offsets = rows[holes] * n
+    val_before, val_after = flat[offsets + before], flat[offsets + after]
+    if method == 'previous':
+        newval = val_before
+    elif method == 'nearest':
+        newval = np.where(i - before <= after - i, val_before, val_after)
     else:
-        n = 2 + (len(df)-size)//(size-overlap)
-        data = df.values.squeeze()
-        ts = df.index.values.squeeze()
-        time_series = [pd.DataFrame({'data':data[(i-1)*(size-overlap):(i-1)*(size-overlap)+size]},index=ts[(i-1)*(size-overlap):(i-1)*(size-overlap)+size]) for i in range(n)]
-        return time_series
+        if method == 'interpolate':
+            x, x_beg, x_end = i, before, after
+        else:
+            ts = as_datetime_index(df.index).asi8
+            x, x_beg, x_end = ts[i], ts[before], ts[after]
+        width = (x_end - x_beg).astype('d')
+        ratio = np.divide(x - x_beg, width, out=np.zeros(len(i)), where=width != 0)
+        newval = val_before + ratio * (val_after - val_before)
+    flat[offsets + i] = newval
+    return pd.DataFrame(values.T, index=df.index, columns=df.columns)
+
+
+def describe_panel(df):
+    """
+    Returns the description of describe for every series of the wide frame
+    df, one row per series.
+    """
+    values = _panel_values(df)
+    m, n = values.shape
+    rows, i_beg, i_end = _runs(np.isnan(values))
+    lengths = pd.Series(i_end - i_beg).groupby(rows)
+    ts = df.index.values
+    retval = pd.DataFrame({
+        'beg': np.repeat(ts[:1], m) if n else pd.NaT,
+        'time step': np.repeat(ts[1:2] - ts[:1], m) if n > 1 else pd.NaT,
+        'end': np.repeat(ts[-1:], m) if n else pd.NaT,
+        '# ts': n,
+        'missing values': np.isnan(values).sum(axis=1),
+        '# holes': np.bincount(rows, minlength=m),
+    }, index=df.columns, columns=['beg', 'time step', 'end', '# ts', 'missing values', '# holes'])
+    for name, stat in (('min hole size', 'min'), ('median hole size', 'median'), ('max hole size', 'max')):
+        retval[name] = lengths.agg(stat).reindex(np.arange(m)).values
+    return retval